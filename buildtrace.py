@@ -0,0 +1,151 @@
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Records when build tasks run and writes a Chrome trace-event file (chrome://tracing, Perfetto)
+with a text summary of the critical path.
+"""
+
+import heapq
+import json
+import threading
+import time
+from collections import namedtuple
+
+TaskRecord = namedtuple("TaskRecord", "key name category worker start end inputs cache deps")
+
+
+class BuildTrace(object):
+    """
+    Collects records of executed and skipped tasks.
+
+    Tasks are identified by `key` and `deps` holds keys of tasks that had to finish first.
+    Skipped up-to-date tasks are recorded as cache hits with zero duration.
+
+    A task holds a worker lane from acquire_lane() until release_lane() while it runs, so the number
+    of lanes is the peak number of tasks running at once. Threads can't serve as lanes because
+    the waf runner may start a new thread for each task.
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.workers = 0
+        self.free_lanes = []
+        self.records = []
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def acquire_lane(self):
+        """Returns the lowest free worker lane."""
+        with self.lock:
+            if self.free_lanes:
+                return heapq.heappop(self.free_lanes)
+            self.workers += 1
+            return self.workers - 1
+
+    def release_lane(self, lane):
+        with self.lock:
+            heapq.heappush(self.free_lanes, lane)
+
+    def add(self, key, name, category, worker, start, end, inputs, cache, deps):
+        record = TaskRecord(key, name, category, worker, start, end, inputs, cache, tuple(deps))
+        with self.lock:
+            self.records.append(record)
+
+    def to_chrome_trace(self):
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": worker, "args": {"name": "worker %d" % worker}}
+                  for worker in range(self.workers)]
+        for record in self.records:
+            event = {
+                "name": record.name,
+                "cat": record.category,
+                "pid": 1,
+                "tid": record.worker,
+                "ts": round(record.start * 1e6),
+                "args": {"inputs": record.inputs, "cache": record.cache},
+            }
+            if record.cache == "hit" and record.end == record.start:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round((record.end - record.start) * 1e6))
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def find_critical_path(self):
+        """Returns the chain of dependent tasks with the longest total duration, first task first."""
+        records = {record.key: record for record in self.records}
+        finish = {}
+        previous = {}
+        for record in sorted(self.records, key=lambda r: r.end):
+            best = None
+            for dep in record.deps:
+                if dep in finish and (best is None or finish[dep] > finish[best]):
+                    best = dep
+            previous[record.key] = best
+            finish[record.key] = (finish[best] if best else 0.0) + record.end - record.start
+        if not finish:
+            return []
+        key = max(finish, key=finish.get)
+        path = []
+        while key is not None:
+            path.append(records[key])
+            key = previous[key]
+        path.reverse()
+        return path
+
+    def summarize(self, top=10):
+        executed = [r for r in self.records if r.cache != "hit"]
+        wall = max((r.end for r in self.records), default=0.0)
+        busy = sum(r.end - r.start for r in executed)
+        path = self.find_critical_path()
+        critical = sum(r.end - r.start for r in path)
+        lines = [
+            "Tasks: %d executed, %d cache hits, %d workers" % (
+                len(executed), len(self.records) - len(executed), self.workers),
+            "Wall time: %.2f s, task time: %.2f s, average parallelism: %.2f" % (
+                wall, busy, busy / wall if wall else 0.0),
+            "Critical path: %.2f s (%.0f%% of wall time)" % (critical, 100 * critical / wall if wall else 0.0),
+        ]
+        for record in path:
+            lines.append("  %8.2f s  %s" % (record.end - record.start, record.name))
+        lines.append("Slowest tasks:")
+        for record in sorted(executed, key=lambda r: r.start - r.end)[:top]:
+            lines.append("  %8.2f s  %s" % (record.end - record.start, record.name))
+        by_category = {}
+        for record in executed:
+            by_category[record.category] = by_category.get(record.category, 0.0) + record.end - record.start
+        lines.append("Time by task type:")
+        for category, duration in sorted(by_category.items(), key=lambda item: -item[1]):
+            lines.append("  %8.2f s  %s" % (duration, category))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes the trace to `path` and the summary to `path`.txt and returns the summary."""
+        with open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        summary = self.summarize()
+        with open(path + ".txt", "wt", encoding="utf-8") as f:
+            f.write(summary)
+        return summary
@@ -1,10 +1,20 @@
 #!/usr/bin/python3
 
-# mergegir.py Name-Vrsion.gir *.gir... 
+# mergegir.py [-i Name-Version]... [-j JOBS] [-c CACHE_DIR] Name-Version.gir base.gir *.gir...
+import hashlib
+import io
+import multiprocessing
 import os
+import pickle
+import shutil
 import sys
+import tempfile
+from array import array
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 
 from xml.etree import ElementTree
+from xml.sax.saxutils import escape
 
 INCLUDE_TAG = "{http://www.gtk.org/introspection/core/1.0}include"
 C_INCLUDE_TAG = "{http://www.gtk.org/introspection/c/1.0}include"
@@ -12,77 +22,449 @@ PACKAGE_TAG = "{http://www.gtk.org/introspection/core/1.0}package"
 CONSTANT_TAG = "{http://www.gtk.org/introspection/core/1.0}constant"
 NAMESPACE_PREFIX = "{http://www.gtk.org/introspection/c/1.0}prefix"
 NAMESPACE_TAG = "{http://www.gtk.org/introspection/core/1.0}namespace"
+C_IDENTIFIER_ATTR = "{http://www.gtk.org/introspection/c/1.0}identifier"
+C_TYPE_ATTR = "{http://www.gtk.org/introspection/c/1.0}type"
+GLIB_NAME_ATTR = "{http://www.gtk.org/introspection/glib/1.0}name"
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
 
-ElementTree.register_namespace("c", "http://www.gtk.org/introspection/c/1.0")
-ElementTree.register_namespace("", "http://www.gtk.org/introspection/core/1.0")
-ElementTree.register_namespace("glib", "http://www.gtk.org/introspection/glib/1.0")
-
-target = sys.argv[1]
-name, version = os.path.basename(target).rsplit(".", 1)[0].split("-")
-root = None
-packages = set()
-includes = set()
-c_includes = set()
-elements = []
-
-
-path = sys.argv[2]
-tree = ElementTree.parse(path)
-gir = root = tree.getroot()
-
-namespace_tag = None
-namespace_tag_pos = None
-for i, child in enumerate(gir):
-	if child.tag == INCLUDE_TAG:
-		includes.add((child.attrib["name"], child.attrib["version"]))
-	elif child.tag == C_INCLUDE_TAG:
-		c_includes.add(child.attrib["name"])
-	elif child.tag == PACKAGE_TAG:
-		packages.add(child.attrib["name"])
-	elif child.tag == NAMESPACE_TAG:
-		namespace_tag_pos = i
-		namespace_tag = child
-		namespace_tag.attrib["name"] = name
-		namespace_tag.attrib["version"] = version
-		namespace_tag.attrib[NAMESPACE_PREFIX] = name
-
-extra_include = [("Drt", "1.0"), ("Drtgtk", "1.0"), ("Engineio", "1.0")]
-for name, version in extra_include:
-	root.insert(namespace_tag_pos, ElementTree.Element(INCLUDE_TAG, attrib={"name": name, "version": version}))
-
-for path in sys.argv[3:]:
-	gir = ElementTree.parse(path).getroot()
-	for child in gir:
-		if child.tag == INCLUDE_TAG:
-			entry = (child.attrib["name"], child.attrib["version"])
-			if entry not in includes:
-				includes.add(entry)
-				root.insert(namespace_tag_pos, child)
-		elif child.tag == C_INCLUDE_TAG:
-			entry = child.attrib["name"]
-			if entry not in c_includes:
-				c_includes.add(entry)
-				root.insert(namespace_tag_pos, child)
-		elif child.tag == PACKAGE_TAG:
-			entry = child.attrib["name"]
-			if entry not in packages:
-				packages.add(entry)
-				root.insert(namespace_tag_pos, child)
-		elif child.tag == NAMESPACE_TAG:
-			for elm in child:
-				namespace_tag.append(elm)
-	gir = None
-
-def fix_constants(elm):
-	to_remove = []
-	for child in elm:
-		if child.tag == CONSTANT_TAG and child.attrib["value"] == "(null)":
-			to_remove.append(child)
-		else:
-			fix_constants(child)
+ATTRIB_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"}
+
+
+class MergeError(Exception):
+	pass
+
+
+class GirHeader:
+	"""Everything that precedes the <namespace> element of a GIR file."""
+	def __init__(self, path):
+		self.namespaces = []
+		self.root = None
+		self.elements = []
+		self.namespace_attrib = {}
+		depth = 0
+		# Stop parsing as soon as the namespace starts, the header is tiny compared to the rest.
+		with open(path, "rb") as f:
+			for event, item in ElementTree.iterparse(f, events=("start-ns", "start", "end")):
+				if event == "start-ns":
+					self.namespaces.append(item)
+				elif event == "start":
+					depth += 1
+					if depth == 1:
+						self.root = item
+					elif depth == 2 and item.tag == NAMESPACE_TAG:
+						self.namespace_attrib = dict(item.attrib)
+						break
+				else:
+					depth -= 1
+					if depth == 1:
+						self.elements.append(item)
+
+
+def iter_namespace_children(path):
+	"""Yields direct children of <namespace> one by one and frees them once processed."""
+	depth = 0
+	namespace = None
+	with open(path, "rb") as f:
+		for event, elm in ElementTree.iterparse(f, events=("start", "end")):
+			if event == "start":
+				depth += 1
+				if depth == 2 and elm.tag == NAMESPACE_TAG:
+					namespace = elm
+			else:
+				depth -= 1
+				if depth == 2 and namespace is not None:
+					yield elm
+					namespace.remove(elm)
+				elif depth == 1:
+					namespace = None
+
+
+def is_null_constant(elm):
+	return elm.tag == CONSTANT_TAG and elm.attrib.get("value") == "(null)"
+
+
+def drop_null_constants(elm):
+	to_remove = [child for child in elm if is_null_constant(child)]
 	for child in to_remove:
 		elm.remove(child)
+	for child in elm:
+		drop_null_constants(child)
+
+
+class GirWriter:
+	"""Serializes GIR elements incrementally, using prefixes declared on the root element."""
+	def __init__(self, f, namespaces):
+		self.f = f
+		self.prefixes = {XML_NAMESPACE: "xml"}
+		self.namespaces = []
+		for prefix, uri in namespaces:
+			if uri not in self.prefixes:
+				self.prefixes[uri] = prefix
+				self.namespaces.append((prefix, uri))
+
+	def qname(self, name):
+		if name[0] != "{":
+			return name
+		uri, local = name[1:].split("}", 1)
+		prefix = self.prefixes[uri]
+		return prefix + ":" + local if prefix else local
+
+	def start_tag(self, tag, attrib, declarations=(), empty=False):
+		buf = ["<", self.qname(tag)]
+		for prefix, uri in declarations:
+			buf.append(' %s="%s"' % ("xmlns:" + prefix if prefix else "xmlns", escape(uri, ATTRIB_ENTITIES)))
+		for name, value in attrib.items():
+			buf.append(' %s="%s"' % (self.qname(name), escape(value, ATTRIB_ENTITIES)))
+		buf.append(" />" if empty else ">")
+		self.f.write("".join(buf))
+
+	def end_tag(self, tag):
+		self.f.write("</%s>" % self.qname(tag))
+
+	def text(self, text):
+		if text:
+			self.f.write(escape(text))
+
+	def element(self, elm):
+		self.f.write(self.serialize(elm))
+
+	def serialize(self, elm, tail=True):
+		f = self.f
+		buf = self.f = io.StringIO()
+		try:
+			self._element(elm, tail)
+		finally:
+			self.f = f
+		return buf.getvalue()
+
+	def _element(self, elm, tail):
+		empty = not elm.text and not len(elm)
+		self.start_tag(elm.tag, elm.attrib, empty=empty)
+		if not empty:
+			self.text(elm.text)
+			for child in elm:
+				self._element(child, True)
+			self.end_tag(elm.tag)
+		if tail:
+			self.text(elm.tail)
+
+
+def compact_digest(data):
+	"""Returns a 64-bit hash of `data` as an int, which takes far less memory than strings or tuples."""
+	return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def member_keys(elm):
+	"""
+	Returns the name of a namespace member and the keys identifying it:
+	compact digests of its tag and name and of its C symbols.
+	"""
+	attrib = elm.attrib
+	name = attrib.get("name") or attrib.get(GLIB_NAME_ATTR)
+	keys = [compact_digest(elm.tag + "\0" + name)] if name else []
+	for attr in (C_IDENTIFIER_ATTR, C_TYPE_ATTR):
+		symbol = attrib.get(attr)
+		if symbol:
+			keys.append(compact_digest("c\0" + symbol))
+			name = name or symbol
+	return name, keys
+
+
+def parse_namespace(path, namespaces):
+	"""
+	Parses namespace members of a GIR file one by one.
+
+	Yields (name, keys, digest, data) tuples, where `data` is a serialized member
+	including its tail and `digest` is a compact hash of the member itself.
+	"""
+	writer = GirWriter(None, namespaces)
+	for elm in iter_namespace_children(path):
+		if not is_null_constant(elm):
+			drop_null_constants(elm)
+			data = writer.serialize(elm, tail=False)
+			name, keys = member_keys(elm)
+			yield name, keys, compact_digest(data), data + (elm.tail or "")
+
+
+def spool_namespace(path, namespaces, spool):
+	"""Streams parsed members of a GIR file to the `spool` file, so that they never pile up in memory."""
+	with open(spool, "wb") as f:
+		for member in parse_namespace(path, namespaces):
+			pickle.dump(member, f, pickle.HIGHEST_PROTOCOL)
+	return spool
+
+
+def read_spool(spool):
+	"""Yields members stored by spool_namespace() and removes the spool file."""
+	try:
+		with open(spool, "rb") as f:
+			while True:
+				try:
+					yield pickle.load(f)
+				except EOFError:
+					break
+	finally:
+		os.unlink(spool)
+
+
+class SymbolIndex:
+	"""
+	Index of namespace members by name and C symbol to detect duplicates in constant time.
+
+	A member defined again with identical content is a duplicate and is skipped. A member
+	whose name or C symbol clashes with a different definition is a conflict.
+
+	The index holds every member of all merged files, so it is an open-addressing hash table
+	of 64-bit key digests in an array, with the content digest and the index of the source
+	packed into a parallel array. That is 16 bytes per slot instead of Python objects per key.
+	It takes about half the memory of a dict of the same ints, but inserts are about twice as
+	slow; see the symbol_index_synthetic benchmark.
+	Members are never removed, so linear probing needs no tombstones.
+	"""
+	SOURCE_BITS = 16
+
+	def __init__(self, sources):
+		if len(sources) >= 1 << self.SOURCE_BITS:
+			raise MergeError("Too many sources to merge: %d." % len(sources))
+		self.sources = sources
+		self.keys = array("Q", bytes(8 * 1024))
+		self.values = array("Q", bytes(8 * 1024))
+		self.size = 0
+		self.duplicates = []
+		self.conflicts = []
+
+	def find(self, key):
+		"""Returns the slot of `key` or of the empty slot where it belongs."""
+		keys = self.keys
+		mask = len(keys) - 1
+		slot = key & mask
+		while True:
+			other = keys[slot]
+			if other == key or not other:
+				return slot
+			slot = (slot + 1) & mask
+
+	def grow(self):
+		keys, values = self.keys, self.values
+		self.keys = array("Q", bytes(16 * len(keys)))
+		self.values = array("Q", bytes(16 * len(values)))
+		for key, value in zip(keys, values):
+			if key:
+				slot = self.find(key)
+				self.keys[slot] = key
+				self.values[slot] = value
+
+	def add(self, name, keys, digest, source):
+		"""Returns True if the member is new, False if it is a duplicate or a conflict."""
+		# Zero marks empty slots, a zero digest shares the slot of 1 instead.
+		keys = [key or 1 for key in keys]
+		for key in keys:
+			slot = self.find(key)
+			if self.keys[slot]:
+				other = self.values[slot]
+				other_source = other & ((1 << self.SOURCE_BITS) - 1)
+				entry = (name, self.sources[source], self.sources[other_source])
+				same = other >> self.SOURCE_BITS == digest >> self.SOURCE_BITS
+				(self.duplicates if same else self.conflicts).append(entry)
+				return False
+		value = (digest >> self.SOURCE_BITS << self.SOURCE_BITS) | source
+		for key in keys:
+			if 3 * (self.size + 1) > 2 * len(self.keys):
+				self.grow()
+			slot = self.find(key)
+			if not self.keys[slot]:
+				self.keys[slot] = key
+				self.values[slot] = value
+				self.size += 1
+		return True
+
+
+def merge_headers(headers, extra_includes):
+	includes = set()
+	c_includes = set()
+	packages = set()
+	elements = []
+
+	def add(elm):
+		if elm.tag == INCLUDE_TAG:
+			entry, seen = (elm.attrib["name"], elm.attrib["version"]), includes
+		elif elm.tag == C_INCLUDE_TAG:
+			entry, seen = elm.attrib["name"], c_includes
+		elif elm.tag == PACKAGE_TAG:
+			entry, seen = elm.attrib["name"], packages
+		else:
+			return
+		if entry not in seen:
+			seen.add(entry)
+			elements.append(elm)
+
+	for elm in headers[0].elements:
+		add(elm)
+	for name, version in extra_includes:
+		add(ElementTree.Element(INCLUDE_TAG, attrib={"name": name, "version": version}))
+	for header in headers[1:]:
+		for elm in header.elements:
+			add(elm)
+	for elm in elements:
+		if not elm.tail:
+			elm.tail = "\n"
+	return elements
+
+
+def hash_file(path):
+	digest = hashlib.sha1()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 16), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def cache_key(name, version, sources, extra_includes, on_conflict):
+	key = hashlib.sha1()
+	key.update(repr((name, version, list(extra_includes), on_conflict)).encode("utf-8"))
+	for path in sources:
+		key.update(hash_file(path).encode("ascii"))
+	return key.hexdigest()
+
+
+def parse_namespaces(sources, namespaces, jobs, spool_dir=None):
+	"""
+	Parses namespace members of all sources and yields an iterator of members for each source in order.
+
+	If `jobs` > 1, sources are parsed by worker processes that stream the members to spool files
+	in `spool_dir`, which are read back one member at a time. Otherwise members are parsed on demand.
+	"""
+	if jobs > 1 and len(sources) > 1:
+		try:
+			context = multiprocessing.get_context("forkserver")
+		except ValueError:
+			context = None
+		with tempfile.TemporaryDirectory(prefix="mergegir-", dir=spool_dir) as tmp:
+			spools = [os.path.join(tmp, "%d.spool" % i) for i in range(len(sources))]
+			with ProcessPoolExecutor(min(jobs, len(sources)), mp_context=context) as executor:
+				for spool in executor.map(spool_namespace, sources, [namespaces] * len(sources), spools):
+					yield read_spool(spool)
+	else:
+		for path in sources:
+			yield parse_namespace(path, namespaces)
+
+
+def store_cached(path, cached):
+	"""
+	Stores the merged GIR file `path` as `cached` and removes other cached merges of the same target,
+	so that the cache holds a single entry per target instead of growing with every change of inputs.
+	"""
+	cache_dir = os.path.dirname(cached)
+	os.makedirs(cache_dir, exist_ok=True)
+	shutil.copyfile(path, cached + ".tmp")
+	os.replace(cached + ".tmp", cached)
+	prefix = os.path.basename(cached).rsplit("-", 1)[0] + "-"
+	for entry in os.listdir(cache_dir):
+		if entry.startswith(prefix) and entry != os.path.basename(cached):
+			try:
+				os.unlink(os.path.join(cache_dir, entry))
+			except FileNotFoundError:
+				pass
+
+
+def merge_gir(target, base, extras, extra_includes=(), on_conflict="error", jobs=1, cache_dir=None):
+	"""
+	Merges GIR files into a single GIR `target` named after its file name, e.g. `Nuvola-1.0.gir`.
+
+	The namespace of the `base` GIR is renamed and the namespaces of `extras` are appended to it.
+	`extra_includes` is a list of (name, version) pairs of additional GIR includes.
+	Identical duplicate members are skipped. Members with a clashing name or C symbol raise
+	MergeError unless `on_conflict` is "first", which keeps the first definition.
+
+	Input GIRs are parsed by up to `jobs` worker processes but spliced in the order given.
+	If `cache_dir` is set, the merged output is stored there under the target name and a hash
+	of the inputs, and an unchanged merge only copies the cached file. Only the latest merge
+	of each target is kept.
+	"""
+	name, version = os.path.basename(target).rsplit(".", 1)[0].split("-")
+	sources = [base] + list(extras)
+	cached = None
+	if cache_dir:
+		cached = os.path.join(cache_dir, "%s-%s-%s.gir" % (
+			name, version, cache_key(name, version, sources, extra_includes, on_conflict)))
+		if os.path.isfile(cached):
+			shutil.copyfile(cached, target)
+			return
+	headers = [GirHeader(path) for path in sources]
+	base = headers[0]
+
+	namespace_attrib = dict(base.namespace_attrib)
+	namespace_attrib["name"] = name
+	namespace_attrib["version"] = version
+	namespace_attrib[NAMESPACE_PREFIX] = name
+
+	namespaces = [ns for header in headers for ns in header.namespaces]
+	index = SymbolIndex(sources)
+	tmp = target + ".tmp"
+	try:
+		with open(tmp, "wt", encoding="utf-8") as f:
+			writer = GirWriter(f, namespaces)
+			f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+			writer.start_tag(base.root.tag, base.root.attrib, writer.namespaces)
+			writer.text(base.root.text)
+			for elm in merge_headers(headers, extra_includes):
+				writer.element(elm)
+			writer.start_tag(NAMESPACE_TAG, namespace_attrib)
+			writer.text("\n")
+			spool_dir = os.path.dirname(os.path.abspath(target))
+			for source, members in enumerate(parse_namespaces(sources, namespaces, jobs, spool_dir)):
+				for name, keys, digest, data in members:
+					if index.add(name, keys, digest, source):
+						f.write(data)
+			writer.text("\n")
+			writer.end_tag(NAMESPACE_TAG)
+			writer.text("\n")
+			writer.end_tag(base.root.tag)
+			writer.text("\n")
+
+		for symbol, source, other_source in index.duplicates:
+			print("Warning: Skipping duplicate '%s' from %s, already defined in %s." % (symbol, source, other_source),
+				file=sys.stderr)
+		if index.conflicts:
+			message = "\n".join("Conflicting definitions of '%s' in %s and %s." % conflict for conflict in index.conflicts)
+			if on_conflict != "first":
+				raise MergeError(message)
+			print("Warning: " + message.replace("\n", "\nWarning: "), file=sys.stderr)
+		if cached:
+			store_cached(tmp, cached)
+		os.replace(tmp, target)
+	finally:
+		# Not left behind by a conflict, an I/O error or an interrupt.
+		if os.path.exists(tmp):
+			os.unlink(tmp)
+
+
+def parse_include(include):
+	name, version = include.rsplit("-", 1)
+	return name, version
+
+
+def main(argv):
+	parser = ArgumentParser(argv[0], description="Merges GIR files into a single one.")
+	parser.add_argument("-i", "--include", action="append", type=parse_include, default=[],
+		help="Add an extra include, e.g. Drt-1.0")
+	parser.add_argument("--on-conflict", choices=("error", "first"), default="error",
+		help="Fail on conflicting definitions or keep the first one")
+	parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+		help="Number of worker processes to parse GIR files")
+	parser.add_argument("-c", "--cache", help="Directory to cache merged GIR files")
+	parser.add_argument("target", help="Target GIR file named Name-Version.gir")
+	parser.add_argument("base", help="Base GIR file")
+	parser.add_argument("extras", nargs="*", help="Additional GIR files")
+	args = parser.parse_args(argv[1:])
+	try:
+		merge_gir(args.target, args.base, args.extras, extra_includes=args.include, on_conflict=args.on_conflict,
+			jobs=args.jobs, cache_dir=args.cache)
+	except MergeError as e:
+		print("Error: %s" % e, file=sys.stderr)
+		return 1
+	return 0
 
-fix_constants(namespace_tag)
 
-tree.write(target, encoding="utf-8", xml_declaration=True)
+if __name__ == "__main__":
+	sys.exit(main(sys.argv))
@@ -23,9 +23,15 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import json
 import os
 import re
+import socketserver
 import sys
+import threading
+import time
+import traceback
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from importlib import import_module
 from string import Template
 from xml.sax.saxutils import escape
@@ -35,9 +41,14 @@ from markdown.extensions import Extension
 
 from jinja2 import Environment, FileSystemLoader
 
-MODE_CODE = 0
-MODE_DOC = 1
-MODE_SYMBOL = 2
+from nuvolajsindex import SourceIndex, DOC_ALIAS
+
+WATCH_INTERVAL = 0.05
+RELOAD_PATH = "/__jsdoc_reload__"
+RELOAD_SCRIPT = """<script>
+new EventSource("%s").onmessage = function () { window.location.reload() }
+</script>
+""" % RELOAD_PATH
 
 FUNCTION_RE = re.compile(r"^\s*(?:var|let|const)\s+(\$?\w+(?:\.\$?\w+)*)\s+=\s+function\s*\((.*)\)\s*\{?$")
 METHOD_RE = re.compile(r"^\s*(\$?\w+(?:\.\$?\w+)*)\s+=\s+function\s*\((.*)\)\s*\{?$")
@@ -46,7 +57,6 @@ OBJECT_RE = re.compile(r"^\s*(?:var|let|const)\s+(\$?\w+(?:\.\$?\w+)*)\s+=\s+\{\
 SIGNAL_RE = re.compile(r"^this\.addSignal\s*\((.*)\)$")
 PROPERTY_RE = re.compile(r'^["\']?(\w+)["\']?\s*:\s*(.+)$')
 FIELD_RE = re.compile(r"^\s*(\$?\w+(?:\.\$?\w+)*)\s+=\s+(.*)\s*$")
-ALIAS_RE = re.compile(r"^(\$?\w+(?:\.\$?\w+)*)\s+=\s+(\$?\w+(?:\.\$?\w+)*)\s*$")
 LINK_RE = re.compile(r'@link\{(?:(\w+?)&gt;)?(.+?)(?:\|(.+?))?\}')
 PARAM_RE = re.compile(r'^(optional\s+)?(?:[\'"](.+?)[\'"]\s*|([^\'"].*?)\s+)(.+?)\s+(.*)$')
 
@@ -62,11 +72,14 @@ def rdotsplit(s):
 
 
 class Node(object):
+    __slots__ = ("source", "lineno", "parent", "name", "doc", "container", "sep")
+    type = "node"
+
     def __init__(self, source, lineno, parent, name, doc, sep=".", container=True):
         self.source = source
         self.lineno = lineno
-        self.parent = parent
-        self.name = name
+        self.parent = sys.intern(parent) if isinstance(parent, str) else parent
+        self.name = sys.intern(name)
         self.doc = doc
         self.container = container
         self.sep = sep
@@ -74,12 +87,8 @@ class Node(object):
     def append(self, child):
         pass
 
-    @property
-    def type(self):
-        type = self.__class__.__name__.lower()
-        if type.endswith("symbol"):
-            return type[:-6]
-        return type
+    def clear(self):
+        pass
 
     def __str__(self):
         return "%s %s %s [%s:%s]" % (self.type, self.parent, self.name, self.source, self.lineno)
@@ -127,6 +136,8 @@ class Symbols(object):
             node.parent = self.get_last_container()
 
         symbol = self.get_symbol_name(node)
+        if symbol:
+            symbol = sys.intern(symbol)
         if node.container:
             self.last_container = symbol
 
@@ -161,6 +172,9 @@ class Symbols(object):
 
 
 class FunctionSymbol(Node):
+    __slots__ = ("params",)
+    type = "function"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = rdotsplit(parts[0])
         Node.__init__(self, source, lineno, parent, name, doc, container=False)
@@ -174,6 +188,9 @@ class FunctionSymbol(Node):
 
 
 class EnumSymbol(Node):
+    __slots__ = ("items",)
+    type = "enum"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = rdotsplit(parts[0])
         Node.__init__(self, source, lineno, parent, name, doc)
@@ -183,6 +200,9 @@ class EnumSymbol(Node):
         self.items.append(child)
         self.items.sort(key=lambda i: i.name)
 
+    def clear(self):
+        self.items = []
+
     def html(self):
         buffer = ['<li>enumeration <b id="%s">%s</b><ul>' % (self.symbol, self.symbol)]
         for item in self.items:
@@ -198,6 +218,9 @@ class EnumSymbol(Node):
 
 
 class MixinSymbol(Node):
+    __slots__ = ("methods",)
+    type = "mixin"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = rdotsplit(parts[0])
         Node.__init__(self, source, lineno, parent, name, doc)
@@ -210,7 +233,13 @@ class MixinSymbol(Node):
         else:
             print("Error: type '%s' not supported for mixins. %s" % (child.type, child))
 
+    def clear(self):
+        self.methods = []
+
 class NamespaceSymbol(Node):
+    __slots__ = ("methods",)
+    type = "namespace"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = rdotsplit(parts[0])
         Node.__init__(self, source, lineno, parent, name, doc)
@@ -223,8 +252,14 @@ class NamespaceSymbol(Node):
         else:
             print("Error: type '%s' not supported for namespaces. %s" % (child.type, child))
 
+    def clear(self):
+        self.methods = []
+
 
 class PrototypeSymbol(Node):
+    __slots__ = ("inherits", "signals", "methods", "properties")
+    type = "prototype"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = rdotsplit(parts[0])
         Node.__init__(self, source, lineno, parent, name, doc)
@@ -247,6 +282,11 @@ class PrototypeSymbol(Node):
             self.properties.append(child)
             self.properties.sort(key=lambda i: i.name)
 
+    def clear(self):
+        self.signals = []
+        self.methods = []
+        self.properties = []
+
     def html(self):
         buffer = ['<li>prototype  <b id="%s">%s</b> inherits %s<ul>' % (self.symbol, self.symbol, ", ".join(["<b>%s</b>" %i for i in self.inherits]))]
         for method in self.methods:
@@ -260,6 +300,9 @@ class PrototypeSymbol(Node):
 
 
 class SignalSymbol(Node):
+    __slots__ = ()
+    type = "signal"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = True, parts[0][1:-1]
         Node.__init__(self, source, lineno, parent, name, doc, "::", container=False)
@@ -269,6 +312,9 @@ class SignalSymbol(Node):
 
 
 class PropertySymbol(Node):
+    __slots__ = ()
+    type = "property"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = True, parts[0]
         Node.__init__(self, source, lineno, parent, name, doc, container=False)
@@ -278,12 +324,18 @@ class PropertySymbol(Node):
 
 
 class FieldSymbol(Node):
+    __slots__ = ("value",)
+    type = "field"
+
     def __init__(self, source, lineno, line, parts, doc):
         parent, name = rdotsplit(parts[0])
         Node.__init__(self, source, lineno, parent, name, doc, container=False)
+        self.value = parts[1].strip()
 
 
 class Alias(object):
+    __slots__ = ("canonical", "alias", "source", "lineno")
+
     def __init__(self, source, lineno, canonical, alias):
         self.canonical = canonical
         self.alias = alias
@@ -295,7 +347,7 @@ class Alias(object):
 
 
 class HtmlPrinter(object):
-    def __init__(self, tree, ns, markdown, interlinks=None):
+    def __init__(self, tree, ns, markdown, interlinks=None, mkd_cache=None):
         self.tree = tree
         self.ns = ns
         self.index = []
@@ -305,6 +357,8 @@ class HtmlPrinter(object):
         self.markdown = markdown
         self.interlinks = interlinks if interlinks is not None else {}
         self.changelog = []
+        self.mkd_cache = mkd_cache if mkd_cache is not None else {}
+        self.mkd_results = {}
 
     def process(self):
         tree = self.tree
@@ -312,7 +366,7 @@ class HtmlPrinter(object):
         symbols = defaultdict(list)
         for symbol, node in tree.symbols.items():
             if node.parent in ns and tree.is_canonical(symbol):
-                symbols[node.type].append(symbol)
+                symbols[node.type].append((symbol, node))
 
         index = self.index
         body = self.body
@@ -327,16 +381,9 @@ class HtmlPrinter(object):
             index.append('<h4>{0}</h4>\n<ul>\n'.format(type_name))
             body.append('<h3>{0}</h3>\n<ul>\n'.format(type_name))
 
-            for symbol in sorted(symbols[types[i]]):
-                node = tree.get_symbol(symbol)
-                type = node.type
-                #~ print(symbol + " (%s) = " % type +str(node))
-                try:
-                    method = getattr(self, "process_" + type)
-                except AttributeError as e:
-                    print(e)
-                    continue
-
+            # All nodes of a group have the same type tag and hence the same handler.
+            method = getattr(self, "process_" + types[i])
+            for symbol, node in sorted(symbols[types[i]], key=lambda item: item[0]):
                 method(symbol, node, index, body)
 
             index.append("</ul>")
@@ -373,8 +420,9 @@ class HtmlPrinter(object):
     def process_signal(self, symbol, node, index, body):
         html_symbol = escape(symbol)
         html_name = escape(node.name)
-        params = [(node.parent, "emitter", "object that emitted the signal")] + node.doc.get(DOC_PARAM, [])
-        node.doc[DOC_PARAM] = params
+        params = [(node.parent, "emitter", "object that emitted the signal")] + list(node.doc.get(DOC_PARAM, ()))
+        doc = node.doc.copy()
+        doc[DOC_PARAM] = params
 
         unique_params = []
         for p in params:
@@ -385,7 +433,7 @@ class HtmlPrinter(object):
         html_params = ", ".join(escape(p) for p in unique_params)
         index.append('<li><a href="#{0}">{1}</a></li>\n'.format(html_symbol, html_name))
         body.append('<li><small>signal</small> <b id="{0}">{1}</b>({2})<br />\n'.format(html_symbol, html_name, html_params))
-        body.extend(self.process_doc(node))
+        body.extend(self.process_doc(node, doc))
         body.append("</li>\n\n")
 
     def process_prototype(self, symbol, node, index, body):
@@ -478,8 +526,9 @@ class HtmlPrinter(object):
         body.extend(self.process_doc(node))
         body.append("</li>\n\n")
 
-    def process_doc(self, node):
-        doc = node.doc
+    def process_doc(self, node, doc=None):
+        # Work on a copy so that the tree can be rendered again in the watch mode.
+        doc = (node.doc if doc is None else doc).copy()
         buf = []
         desc = doc.pop(DOC_DESC, None)
         text = doc.pop(DOC_TEXT, None)
@@ -646,7 +695,12 @@ class HtmlPrinter(object):
         return LINK_RE.sub(lambda m: self.replace_link(m.group(1), m.group(2), m.group(3)), text)
 
     def mkd(self, s):
-        return self.markdown.convert(s)
+        try:
+            html = self.mkd_cache[s]
+        except KeyError:
+            html = self.markdown.convert(s)
+        self.mkd_results[s] = html
+        return html
 
 DOC_DESC = "@desc"
 DOC_TEXT = "@text"
@@ -657,6 +711,56 @@ DOC_IGNORE = ("@signal", "@mixin", "@enum", "@namespace")
 DOC_ASYNC = "@async"
 DOC_SINCE = "@since"
 DOC_DEPRECATED = "@deprecated"
+DOC_FIELDS = {
+    DOC_DESC: "desc",
+    DOC_TEXT: "text",
+    DOC_PARAM: "params",
+    DOC_RETURN: "returns",
+    DOC_THROW: "throws",
+    DOC_ASYNC: "is_async",
+    DOC_SINCE: "since",
+    DOC_DEPRECATED: "deprecated",
+}
+
+
+class DocComment(object):
+    """
+    Parsed doc comment with a fixed set of sections.
+
+    Sections are accessed by DOC_* tags. Missing sections are stored as None and read as empty.
+    """
+    __slots__ = tuple(DOC_FIELDS.values())
+
+    def __init__(self, sections=None):
+        for tag, field in DOC_FIELDS.items():
+            value = sections.get(tag) if sections else None
+            setattr(self, field, tuple(value) if value else None)
+
+    def get(self, tag, default=None):
+        value = getattr(self, DOC_FIELDS[tag])
+        return default if value is None else value
+
+    def pop(self, tag, default=None):
+        field = DOC_FIELDS[tag]
+        value = getattr(self, field)
+        setattr(self, field, None)
+        return default if value is None else value
+
+    def copy(self):
+        doc = DocComment()
+        for field in self.__slots__:
+            setattr(doc, field, getattr(self, field))
+        return doc
+
+    def __getitem__(self, tag):
+        return self.get(tag, ())
+
+    def __setitem__(self, tag, value):
+        setattr(self, DOC_FIELDS[tag], tuple(value) if value else None)
+
+    def __iter__(self):
+        return (tag for tag, field in DOC_FIELDS.items() if getattr(self, field) is not None)
+
 
 def parse_doc_comment(doc):
     mode = DOC_DESC
@@ -699,7 +803,7 @@ def parse_doc_comment(doc):
     except KeyError:
         pass
 
-    return result
+    return DocComment(result)
 
 def parse_param(param):
     param = " ".join(s.strip() for s in param)
@@ -754,41 +858,21 @@ def parse_symbol(symbol, doc_head):
     return None, None
 
 
-def parse_source(source):
-    mode = MODE_CODE
-    level = 0
-    doc = None
-    with open(source, "rt", encoding="utf-8") as f:
-        lineno = 0
-        for line in f:
-            bare = line.strip()
-            lineno += 1
-            if mode == MODE_CODE:
-                level = line.find("/**")
-                if level >= 0:
-                    mode = MODE_DOC
-                    doc = []
-                else:
-                    m = ALIAS_RE.match(line)
-                    if m:
-                        yield Alias(source, lineno, m.group(1), m.group(2))
-
-            elif mode == MODE_DOC:
-                if line[level:level+2] != " *":
-                    print("Error: Wrong level: %s:%s: %r" % (source, lineno, line))
-
-
-                if bare == "*/":
-                    mode = MODE_SYMBOL
-                else:
-                    doc.append(bare[2:])
+def parse_source(source, index=None):
+    record = (index or SourceIndex()).get(source)
+    for error in record["errors"]:
+        print(error)
+    for entry in record["docs"]:
+        if entry[1] == DOC_ALIAS:
+            lineno, kind, canonical, alias = entry
+            yield Alias(source, lineno, canonical, alias)
+        else:
+            lineno, kind, bare, doc = entry
+            klass, parts = parse_symbol(bare, doc[0])
+            if klass is None:
+                print("Error: Unknown symbol type at {0}:{1} '{2}'".format(source, lineno, bare))
             else:
-                mode = MODE_CODE
-                klass, parts = parse_symbol(bare, doc[0])
-                if klass is None:
-                    print("Error: Unknown symbol type at {0}:{1} '{2}'".format(source, lineno, bare))
-                else:
-                    yield klass(source, lineno, bare, parts, parse_doc_comment(doc))
+                yield klass(source, lineno, bare, parts, parse_doc_comment(doc))
 
 def make_tree(tree, nodes):
     for node in nodes:
@@ -800,57 +884,301 @@ def make_tree(tree, nodes):
         else:
             tree.add_symbol(node)
 
-def process_template(template, data):
-    loader = FileSystemLoader(os.path.dirname(template), encoding='utf-8')
-    env = Environment(loader=loader)
+def process_template(template, data, env=None):
+    if env is None:
+        env = Environment(loader=FileSystemLoader(os.path.dirname(template), encoding='utf-8'))
     template = env.get_template(os.path.basename(template))
     return template.render(**data)
 
 def load_config(config_file):
-    sys.path.insert(0, os.path.dirname(config_file))
+    config_dir = os.path.abspath(os.path.dirname(config_file))
+    # Forget previously imported config modules so that a long-lived process picks up their changes.
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == config_dir:
+            del sys.modules[name]
+    sys.path.insert(0, config_dir)
     config = import_module(os.path.basename(config_file).rsplit(".", 1)[0])
     sys.path.pop(0)
     return config
 
-def generate_doc(ns, out_file, sources_dir, config_file, template=None):
-    config = load_config(config_file)
-    if template is None:
-        try:
-            template = config.TEMPLATE
-        except AttributeError:
-            raise ValueError("Template not specified")
-
-    tree = Symbols(ns)
-
-    for source in gather_sources(sources_dir):
-        make_tree(tree, parse_source(source))
-
-
-    markdown = Markdown(
-        extensions = ['sane_lists', 'fenced_code', 'codehilite', 'def_list', 'attr_list', 'abbr', 'admonition'],
-        safe_mode='escape',
-        lazy_ol=False)
+class DocGenerator(object):
+    """
+    Keeps parsed sources in memory so that the documentation can be regenerated
+    after a change without parsing unmodified files again. Scanned sources are
+    also persisted in `index_file` if it is set. Sources are either found in
+    `sources_dir` or given as a list of `source_files`.
+    """
+    def __init__(self, ns, out_file, sources_dir, config_file, template=None, index_file=None, source_files=None):
+        config = load_config(config_file)
+        if template is None:
+            try:
+                template = config.TEMPLATE
+            except AttributeError:
+                raise ValueError("Template not specified")
 
-    interlinks = getattr(config, "INTERLINKS", defaultdict(str))
-    printer = HtmlPrinter(tree, ns, markdown, interlinks=interlinks)
-    index, body = printer.process()
+        self.ns = ns
+        self.out_file = out_file
+        self.sources_dir = sources_dir
+        self.source_files = source_files
+        self.template = template
+        self.template_mtime = None
+        self.env = Environment(loader=FileSystemLoader(os.path.dirname(template), encoding='utf-8'))
+        self.interlinks = getattr(config, "INTERLINKS", defaultdict(str))
+        self.data = {key: getattr(config, key) for key in dir(config) if not key.startswith("_")}
+        self.markdown = Markdown(
+            extensions = ['sane_lists', 'fenced_code', 'codehilite', 'def_list', 'attr_list', 'abbr', 'admonition'],
+            safe_mode='escape',
+            lazy_ol=False)
+        self.mkd_cache = {}
+        self.index = SourceIndex(index_file)
+        self.sources = []
+        self.nodes = {}
+        self.mtimes = {}
+
+    def update(self):
+        """Parses new and modified source files. Returns True if the documentation is outdated."""
+        changed = False
+        if self.source_files is not None:
+            sources = list(self.source_files)
+        else:
+            sources = list(gather_sources(self.sources_dir))
+        if sources != self.sources:
+            changed = True
+            for source in set(self.sources).difference(sources):
+                del self.nodes[source]
+                del self.mtimes[source]
+            self.sources = sources
+
+        for source in sources:
+            mtime = os.stat(source).st_mtime_ns
+            if self.mtimes.get(source) != mtime:
+                self.nodes[source] = list(parse_source(source, self.index))
+                self.mtimes[source] = mtime
+                changed = True
+        self.index.save()
+
+        mtime = os.stat(self.template).st_mtime_ns
+        if mtime != self.template_mtime:
+            self.template_mtime = mtime
+            changed = True
+        return changed
+
+    def render(self):
+        tree = Symbols(self.ns)
+        for source in self.sources:
+            nodes = self.nodes[source]
+            for node in nodes:
+                if isinstance(node, Node):
+                    node.clear()
+            make_tree(tree, nodes)
+
+        printer = HtmlPrinter(tree, self.ns, self.markdown, interlinks=self.interlinks, mkd_cache=self.mkd_cache)
+        index, body = printer.process()
+        # Only documentation comments that haven't changed are worth keeping.
+        self.mkd_cache = printer.mkd_results
+
+        data = dict(self.data)
+        data["index"] = index
+        data["body"] = body
+        return process_template(self.template, data, self.env)
+
+    def write(self):
+        try:
+            os.makedirs(os.path.dirname(self.out_file))
+        except OSError:
+            pass
+        with open(self.out_file, "wt", encoding="utf-8") as f:
+            f.write(self.render())
+
+def generate_doc(ns, out_file, sources_dir, config_file, template=None, index_file=None):
+    generator = DocGenerator(ns, out_file, sources_dir, config_file, template, index_file)
+    generator.update()
+    generator.write()
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == RELOAD_PATH:
+            self.send_reload_events()
+        elif os.path.abspath(self.translate_path(self.path)) == self.server.out_file:
+            self.send_page()
+        else:
+            SimpleHTTPRequestHandler.do_GET(self)
+
+    def send_page(self):
+        with open(self.server.out_file, "rt", encoding="utf-8") as f:
+            page = f.read()
+        head, sep, tail = page.rpartition("</body>")
+        data = "".join((head, RELOAD_SCRIPT, sep, tail) if sep else (page, RELOAD_SCRIPT)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_reload_events(self):
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        with server.revision_changed:
+            revision = server.revision
+        try:
+            while True:
+                with server.revision_changed:
+                    server.revision_changed.wait_for(lambda: server.revision != revision, timeout=15)
+                    changed = server.revision != revision
+                    revision = server.revision
+                # A comment line keeps the connection alive and detects disconnected clients.
+                self.wfile.write(b"data: reload\n\n" if changed else b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
 
-    data = {key: getattr(config, key) for key in dir(config) if not key.startswith("_")}
-    data["index"] = index
-    data["body"] = body
+class LiveReloadServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, out_file):
+        self.out_file = os.path.abspath(out_file)
+        self.revision = 0
+        self.revision_changed = threading.Condition()
+        root = os.path.dirname(os.path.dirname(self.out_file))
+        handler = lambda *args, **kwargs: LiveReloadHandler(*args, directory=root, **kwargs)
+        ThreadingHTTPServer.__init__(self, address, handler)
+        self.url = "http://%s:%s/%s" % (address[0], self.server_port, os.path.relpath(self.out_file, root))
+
+    def reload(self):
+        with self.revision_changed:
+            self.revision += 1
+            self.revision_changed.notify_all()
+
+def serve_doc(ns, out_file, sources_dir, config_file, template=None, host="localhost", port=8000,
+        index_file=None):
+    """Regenerates documentation whenever sources change and reloads it in the web browser."""
+    generator = DocGenerator(ns, out_file, sources_dir, config_file, template, index_file)
+    generator.update()
+    generator.write()
+    server = LiveReloadServer((host, port), out_file)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print("Serving documentation at %s" % server.url)
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            try:
+                start = time.perf_counter()
+                if not generator.update():
+                    continue
+                generator.write()
+                print("Documentation regenerated in %.1f ms." % ((time.perf_counter() - start) * 1000))
+            except Exception:
+                traceback.print_exc()
+                continue
+            server.reload()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
 
+class DocDaemonHandler(socketserver.StreamRequestHandler):
+    """Handles a single JSON request per connection and replies with a single JSON line."""
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            command = request.get("command", "generate")
+            if command == "generate":
+                response = self.server.generate(request)
+            elif command == "ping":
+                response = {"status": "ok", "pid": os.getpid(), "generators": len(self.server.generators)}
+            elif command == "shutdown":
+                response = {"status": "ok"}
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                response = {"status": "error", "error": "Unknown command: %r" % command}
+        except Exception:
+            response = {"status": "error", "error": traceback.format_exc()}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+class DocDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Keeps markdown, jinja2 and a DocGenerator per job loaded between requests sent over a Unix socket
+    by nuvolajsdocclient. A generator is created again when a Python file in the config directory changes.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        self.socket_path = os.path.abspath(socket_path)
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        socketserver.ThreadingUnixStreamServer.__init__(self, self.socket_path, DocDaemonHandler)
+        self.lock = threading.Lock()
+        self.generators = {}
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def get_config_stamp(self, config_file):
+        config_dir = os.path.dirname(config_file)
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(config_dir) if entry.name.endswith(".py")))
+
+    def generate(self, job):
+        start = time.perf_counter()
+        key = tuple(job.get(name) for name in ("ns", "out_file", "sources_dir", "config_file", "template", "index_file"))
+        source_files = job.get("source_files")
+        # Generators are not thread-safe and loading configs modifies sys.path, so jobs run one at a time.
+        with self.lock:
+            stamp = self.get_config_stamp(job["config_file"])
+            generator, generator_stamp = self.generators.get(key, (None, None))
+            if generator is None or generator_stamp != stamp:
+                generator = DocGenerator(*key)
+                self.generators[key] = generator, stamp
+            generator.source_files = source_files
+            changed = generator.update()
+            generator.write()
+        return {"status": "ok", "changed": changed, "elapsed": (time.perf_counter() - start) * 1000}
+
+def run_daemon(socket_path):
+    """Serves documentation jobs over a Unix socket until it is shut down."""
+    server = DocDaemon(socket_path)
+    print("Documentation daemon listening at %s" % server.socket_path)
     try:
-        os.makedirs(os.path.dirname(out_file))
-    except OSError:
+        server.serve_forever()
+    except KeyboardInterrupt:
         pass
-    with open(out_file, "wt", encoding="utf-8") as f:
-        f.write(process_template(template, data))
+    finally:
+        server.server_close()
 
 if __name__ == "__main__":
-    import sys
     import argparse
     parser = argparse.ArgumentParser(description='Generates JavaScript documentation.')
     parser.add_argument('-t','--template',  help='template to use')
+    parser.add_argument('--serve', action='store_true',
+        help='serve documentation over HTTP and regenerate it when sources change')
+    parser.add_argument('--host', default='localhost', help='host name to serve documentation at [localhost]')
+    parser.add_argument('--port', type=int, default=8000, help='port to serve documentation at [8000]')
+    parser.add_argument('--index', default='build/jsindex.json',
+        help='file to persist the index of scanned sources in [build/jsindex.json]')
+    parser.add_argument('--daemon', metavar='SOCKET', nargs='?', const='build/jsdoc.sock',
+        help='keep running and generate documentation for nuvolajsdocclient requests [build/jsdoc.sock]')
     result = parser.parse_args(sys.argv[1:])
-    generate_doc("Nuvola", "build/doc/apps/api_reference.html", "src/mainjs", "doc/jsdoc_conf.py",
-        result.template)
+    if result.daemon:
+        run_daemon(result.daemon)
+    elif result.serve:
+        serve_doc("Nuvola", "build/doc/apps/api_reference.html", "src/mainjs", "doc/jsdoc_conf.py",
+            result.template, result.host, result.port, result.index)
+    else:
+        generate_doc("Nuvola", "build/doc/apps/api_reference.html", "src/mainjs", "doc/jsdoc_conf.py",
+            result.template, result.index)
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# coding: utf-8
+
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Thin client for the documentation daemon started with `nuvolajsdoc.py --daemon`. It imports nothing but
+the standard library, so submitting a job costs a socket round trip instead of loading markdown, pygments
+and jinja2 and parsing all sources again. It falls back to generating the documentation in-process when
+no daemon is running.
+"""
+
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = "build/jsdoc.sock"
+
+
+class DaemonError(Exception):
+    pass
+
+
+def request(socket_path, message, timeout=None):
+    """Sends a JSON `message` to the daemon and returns its JSON response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise DaemonError("The daemon closed the connection without a response.")
+    response = json.loads(line.decode("utf-8"))
+    if response.get("status") != "ok":
+        raise DaemonError(response.get("error", "Unknown error"))
+    return response
+
+
+def generate(socket_path, ns, out_file, sources_dir, config_file, template=None, index_file=None,
+        source_files=None, timeout=None):
+    """Submits a generation job. Paths are made absolute because the daemon may run elsewhere."""
+    def abspath(path):
+        return os.path.abspath(path) if path is not None else None
+
+    return request(socket_path, {
+        "command": "generate",
+        "ns": ns,
+        "out_file": abspath(out_file),
+        "sources_dir": abspath(sources_dir),
+        "config_file": abspath(config_file),
+        "template": abspath(template),
+        "index_file": abspath(index_file),
+        "source_files": [abspath(path) for path in source_files] if source_files is not None else None,
+    }, timeout)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Submits a documentation job to the nuvolajsdoc daemon.')
+    parser.add_argument('-t','--template',  help='template to use')
+    parser.add_argument('--index', default='build/jsindex.json',
+        help='file to persist the index of scanned sources in [build/jsindex.json]')
+    parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET, help='daemon socket [%s]' % DEFAULT_SOCKET)
+    parser.add_argument('--no-fallback', action='store_true',
+        help='fail instead of generating documentation in-process when the daemon is not running')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--ping', action='store_true', help='check whether the daemon is running')
+    group.add_argument('--shutdown', action='store_true', help='stop the daemon')
+    result = parser.parse_args(sys.argv[1:])
+
+    try:
+        if result.ping or result.shutdown:
+            response = request(result.socket, {"command": "ping" if result.ping else "shutdown"})
+            if result.ping:
+                print("Daemon %d is running with %d generator(s)." % (response["pid"], response["generators"]))
+        else:
+            response = generate(result.socket, "Nuvola", "build/doc/apps/api_reference.html", "src/mainjs",
+                "doc/jsdoc_conf.py", result.template, result.index)
+            print("Documentation %s in %.1f ms." % (
+                "regenerated" if response["changed"] else "rendered from cached sources", response["elapsed"]))
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        if result.ping or result.shutdown or result.no_fallback:
+            sys.exit("Error: The daemon is not running at %s: %s" % (result.socket, e))
+        import nuvolajsdoc
+        nuvolajsdoc.generate_doc("Nuvola", "build/doc/apps/api_reference.html", "src/mainjs",
+            "doc/jsdoc_conf.py", result.template, result.index)
+    except DaemonError as e:
+        sys.exit("Error: %s" % e)
@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Reads each JavaScript source once and extracts everything nuvolamergejs and nuvolajsdoc need:
+require() headers and the body for merging, and doc comments with their symbols and aliases.
+"""
+
+import json
+import os
+import re
+import threading
+
+INDEX_FORMAT = 1
+ALIAS_RE = re.compile(r"^(\$?\w+(?:\.\$?\w+)*)\s+=\s+(\$?\w+(?:\.\$?\w+)*)\s*$")
+
+MODE_CODE = 0
+MODE_DOC = 1
+MODE_SYMBOL = 2
+
+DOC_ALIAS = "alias"
+DOC_SYMBOL = "symbol"
+
+
+def scan_source(path):
+    """
+    Scans a JavaScript source file in a single pass and returns its record:
+
+      * `name`: module name, i.e. the file name without extension,
+      * `requires`: names of modules from require() calls in the header,
+      * `require_error`: (lineno, line) of an unparseable require() call or None,
+      * `data`: lines of the body without blank and comment lines,
+      * `docs`: (lineno, DOC_ALIAS, canonical, alias) or (lineno, DOC_SYMBOL, line, doc_lines) entries,
+      * `errors`: messages about malformed doc comments.
+    """
+    requires = []
+    require_error = None
+    data = []
+    docs = []
+    errors = []
+    head = True
+    mode = MODE_CODE
+    level = 0
+    doc = None
+    with open(path, "rt", encoding="utf-8") as f:
+        lineno = 0
+        for line in f:
+            bare = line.strip()
+            lineno += 1
+
+            # Dependencies and body
+            if bare and not bare.startswith(("/*", "*", "//")):
+                if head:
+                    if bare.startswith("require("):
+                        for q in ('"', "'"):
+                            parts = bare.split(q)
+                            if len(parts) == 3:
+                                requires.append(parts[1])
+                                break
+                        else:
+                            if require_error is None:
+                                require_error = (lineno, bare)
+                    else:
+                        head = False
+                        data.append(line)
+                else:
+                    data.append(line)
+
+            # Doc comments
+            if mode == MODE_CODE:
+                level = line.find("/**")
+                if level >= 0:
+                    mode = MODE_DOC
+                    doc = []
+                else:
+                    m = ALIAS_RE.match(line)
+                    if m:
+                        docs.append((lineno, DOC_ALIAS, m.group(1), m.group(2)))
+            elif mode == MODE_DOC:
+                if line[level:level+2] != " *":
+                    errors.append("Error: Wrong level: %s:%s: %r" % (path, lineno, line))
+                if bare == "*/":
+                    mode = MODE_SYMBOL
+                else:
+                    doc.append(bare[2:])
+            else:
+                mode = MODE_CODE
+                docs.append((lineno, DOC_SYMBOL, bare, doc))
+
+    return {
+        "name": os.path.basename(path).rsplit(".", 1)[0],
+        "requires": requires,
+        "require_error": require_error,
+        "data": data,
+        "docs": docs,
+        "errors": errors,
+    }
+
+
+class SourceIndex(object):
+    """
+    Records of scanned sources, optionally persisted in a JSON file.
+
+    A source is scanned again only if its size or modification time has changed.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.modified = False
+        if path:
+            try:
+                with open(path, "rt", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("format") == INDEX_FORMAT:
+                    self.entries = index["sources"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def get(self, source):
+        """Returns a record of `source`, see scan_source()."""
+        source = os.path.abspath(source)
+        stat = os.stat(source)
+        entry = self.entries.get(source)
+        if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "record": scan_source(source)}
+            self.entries[source] = entry
+            self.modified = True
+        return entry["record"]
+
+    def save(self):
+        if not self.path or not self.modified:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = "%s.%d.%d.tmp" % (self.path, os.getpid(), threading.get_ident())
+        with open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT, "sources": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self.modified = False
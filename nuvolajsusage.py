@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+# coding: utf-8
+
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Cross-references the NuvolaKit JavaScript API documented in src/mainjs with its usage in web app integrations.
+
+All names an integration can refer to a documented symbol by are compiled into a single regular expression
+shaped as a trie, so that each integrate.js is scanned in one pass no matter how many symbols there are.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+from nuvolajsdoc import Symbols, FieldSymbol, DOC_DEPRECATED, gather_sources, make_tree, parse_source
+from nuvolajsindex import SourceIndex
+
+USAGE_FORMAT = 1
+INSTANCE_RE = re.compile(r"^(?:Nuvola\.)?\$object\s*\(\s*(\$?\w+(?:\.\$?\w+)*)\s*\)$")
+
+_matcher = None
+
+
+def load_symbols(sources_dir, ns="Nuvola", index_file=None):
+    """Builds the nuvolajsdoc symbol tree of sources in `sources_dir`."""
+    tree = Symbols(ns)
+    index = SourceIndex(index_file)
+    for source in sorted(gather_sources(sources_dir)):
+        make_tree(tree, parse_source(source, index))
+    index.save()
+    return tree
+
+
+def resolve(tree, name):
+    return tree.get_canonical(name) or tree.get_canonical(tree.ns + "." + name)
+
+
+def get_members(tree, prototype, members, seen=None):
+    """Yields (name, canonical) pairs of members of `prototype` including the inherited ones."""
+    seen = seen if seen is not None else set()
+    if prototype is None or prototype in seen:
+        return
+    seen.add(prototype)
+    yield from members.get(prototype, ())
+    for parent in getattr(tree.symbols[prototype], "inherits", ()):
+        yield from get_members(tree, resolve(tree, parent), members, seen)
+
+
+def collect_patterns(tree):
+    """
+    Maps names that integrations use to refer to documented symbols to sets of canonical symbol names:
+
+      * canonical names and aliases, which also cover local constants such as
+        `const PlaybackState = Nuvola.PlaybackState` followed by `PlaybackState.PLAYING`,
+      * members accessed through instance objects, e.g. `Nuvola.actions.addAction`,
+      * signal names as string literals passed to connect(), e.g. `'ActionActivated'`.
+
+    A name also uses the symbols of its dotted prefixes, e.g. `Nuvola.actions.addAction` uses `Nuvola.actions`.
+    """
+    canonical_names = set(tree.canonical.values())
+    members = defaultdict(list)
+    for canonical in canonical_names:
+        if "::" not in canonical and "." in canonical:
+            parent, name = canonical.rsplit(".", 1)
+            members[parent].append((name, canonical))
+
+    patterns = defaultdict(set)
+    for name, canonical in tree.canonical.items():
+        if "::" in name:
+            signal = name.split("::", 1)[1]
+            patterns["'%s'" % signal].add(canonical)
+            patterns['"%s"' % signal].add(canonical)
+        else:
+            patterns[name].add(canonical)
+
+    for canonical in canonical_names:
+        node = tree.symbols[canonical]
+        if isinstance(node, FieldSymbol):
+            m = INSTANCE_RE.match(node.value)
+            if m:
+                for name, member in get_members(tree, resolve(tree, m.group(1)), members):
+                    patterns[canonical + "." + name].add(member)
+
+    direct = {pattern: frozenset(symbols) for pattern, symbols in patterns.items()}
+    for pattern, symbols in patterns.items():
+        prefix = pattern
+        while "." in prefix:
+            prefix = prefix.rsplit(".", 1)[0]
+            symbols.update(direct.get(prefix, ()))
+    return patterns
+
+
+def make_trie_regex(words):
+    """
+    Returns a regular expression matching any of `words`, longest first. Common prefixes are shared,
+    so the regex engine tries each character of the input once per position instead of once per word.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:%s)" % "|".join(branches)
+        return "(?:%s)?" % body if "" in node else body
+
+    return build(trie)
+
+
+def compile_matcher(patterns):
+    # Names must not be a part of a longer identifier or a member of some other object.
+    return re.compile(r"(?<![\w$.])(%s)(?![\w$])" % make_trie_regex(patterns))
+
+
+def _init_worker(patterns):
+    global _matcher
+    _matcher = compile_matcher(patterns)
+
+
+def scan_file(path):
+    """Returns (path, {pattern: count}) of names found in the file at `path`."""
+    counts = defaultdict(int)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for m in _matcher.finditer(f.read()):
+            counts[m.group(1)] += 1
+    return path, dict(counts)
+
+
+def get_app_id(path):
+    return os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+
+def build_usage(tree, files, jobs=1):
+    """Scans integration `files` in parallel and returns the usage index."""
+    patterns = collect_patterns(tree)
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(min(jobs, len(files)), initializer=_init_worker, initargs=(sorted(patterns),)) as executor:
+            results = list(executor.map(scan_file, files, chunksize=max(1, len(files) // (jobs * 4))))
+    else:
+        _init_worker(sorted(patterns))
+        results = [scan_file(path) for path in files]
+
+    usage = defaultdict(dict)
+    for path, counts in results:
+        app_id = get_app_id(path)
+        for pattern, count in counts.items():
+            for symbol in patterns[pattern]:
+                usage[symbol][app_id] = usage[symbol].get(app_id, 0) + count
+
+    deprecated = {}
+    for symbol in sorted(set(tree.canonical.values())):
+        doc = tree.symbols[symbol].doc
+        items = doc.get(DOC_DEPRECATED) if doc else None
+        if items:
+            note = "; ".join(" ".join(line.strip() for line in item) for item in items)
+            deprecated[symbol] = {"note": note, "apps": sorted(usage.get(symbol, ()))}
+
+    return {
+        "format": USAGE_FORMAT,
+        "apps": sorted(get_app_id(path) for path in files),
+        "symbols": {symbol: dict(sorted(apps.items())) for symbol, apps in sorted(usage.items())},
+        "unused": sorted(set(tree.canonical.values()).difference(usage)),
+        "deprecated": deprecated,
+    }
+
+
+def main(argv):
+    parser = ArgumentParser(argv[0], description="Cross-references NuvolaKit API usage in web app integrations.")
+    parser.add_argument("-s", "--sources", default="src/mainjs", help="Directory with NuvolaKit sources [src/mainjs]")
+    parser.add_argument("-d", "--directory", action="append", default=[],
+        help="Directory with web apps to scan for */integrate.js [web_apps]")
+    parser.add_argument("-o", "--output", help="Path to write the JSON usage index to")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Number of integrations to scan in parallel")
+    parser.add_argument("--index", default="build/jsindex.json",
+        help="File to persist the index of scanned sources in [build/jsindex.json]")
+    parser.add_argument("files", nargs="*", help="Additional integrate.js files")
+    args = parser.parse_args(argv[1:])
+
+    directories = args.directory if args.directory or args.files else ["web_apps"]
+    files = sorted(set(args.files).union(*(glob(os.path.join(d, "*", "integrate.js")) for d in directories)))
+    start = time.perf_counter()
+    tree = load_symbols(args.sources, index_file=args.index)
+    usage = build_usage(tree, files, max(1, args.jobs))
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        with open(args.output, "wt", encoding="utf-8") as f:
+            json.dump(usage, f, indent=2)
+            f.write("\n")
+
+    print("Scanned %d integration(s) for %d symbol(s) in %.2f s: %d used, %d unused." % (
+        len(files), len(usage["symbols"]) + len(usage["unused"]), elapsed, len(usage["symbols"]), len(usage["unused"])))
+    for symbol, info in usage["deprecated"].items():
+        apps = info["apps"]
+        print("Deprecated %s (%s): %s" % (symbol, info["note"], ", ".join(apps) if apps else "unused"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -23,8 +23,14 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import gzip
 import os
-from codecs import open
+import re
+
+from nuvolajsindex import SourceIndex
+
+BUDGET_RE = re.compile(r"^(?:(raw|gzip):)?(\d+)([kK]?)$")
+GZIP_LEVEL = 9
 
 class Source:
     def __init__(self, name, path, requires, data):
@@ -47,38 +53,50 @@ class NotFoundError(Exception):
     def __init__(self, path, requirement):
         Exception.__init__(self, "File '%s' requires dependency '%s' that hasn't been found." % (path, requirement))
 
-def parse_sources(files):
+class BudgetError(ValueError):
+    def __init__(self, spec):
+        ValueError.__init__(self, "Invalid size budget '%s', expected e.g. '120000', '120k' or 'gzip:30k'." % spec)
+
+def parse_sources(files, index=None):
+    if index is None:
+        index = SourceIndex()
     sources = {}
     for path in files:
-        name = os.path.basename(path).rsplit(".", 1)[0]
-        requires = []
-        data = []
-        head = True
-
-        with open(path, encoding="utf-8") as f:
-            lineno = 0
-            for line in f:
-                bare_line = line.strip()
-                lineno += 1
-                if bare_line and not bare_line.startswith(("/*", "*", "//")):
-                    if head:
-                        if bare_line.startswith("require("):
-                            for q in ('"', "'"):
-                                parts = bare_line.split(q)
-                                if len(parts) == 3:
-                                    requires.append(parts[1])
-                                    break
-                            else:
-                                raise ParseError(path, lineno, bare_line)
-                        else:
-                            head = False
-                            data.append(line)
-                    else:
-                        data.append(line)
-        sources[name] = Source(name, path, requires, data)
+        record = index.get(path)
+        if record["require_error"]:
+            raise ParseError(path, *record["require_error"])
+        sources[record["name"]] = Source(record["name"], path, record["requires"], record["data"])
 
     return sources
 
+def find_closure(entries, paths, index=None):
+    """
+    Returns paths of `entries` and all their direct and indirect requirements.
+
+    `entries` are module names and `paths` are all source files to look the requirements up in.
+    """
+    if index is None:
+        index = SourceIndex()
+    modules = {os.path.basename(path).rsplit(".", 1)[0]: path for path in paths}
+    closure = []
+    visited = set()
+    pending = [(None, name) for name in reversed(entries)]
+    while pending:
+        parent, name = pending.pop()
+        if name in visited:
+            continue
+        try:
+            path = modules[name]
+        except KeyError:
+            raise NotFoundError(parent or "<entries>", name)
+        visited.add(name)
+        closure.append(path)
+        record = index.get(path)
+        if record["require_error"]:
+            raise ParseError(path, *record["require_error"])
+        pending.extend((path, dep) for dep in reversed(record["requires"]))
+    return closure
+
 def add_source(output, sources, source):
     source.visited += 1
     if source.visited > 25:
@@ -94,32 +112,147 @@ def add_source(output, sources, source):
             add_source(output, sources, dep_source)
 
     if not source.merged:
-        output.append("// Included file '%s'\n" % source.path)
+        output.append(get_header(source))
         output.extend(source.data)
         source.merged = True
 
-def merge_sources(sources, main):
+def get_header(source):
+    return "// Included file '%s'\n" % source.path
+
+def merge_sources(sources, main, entries=None):
     output = [
         "var global = (function (){return (function(){return this;}).call(null);})();\n",
         "(function(Nuvola)\n{\n    'use strict';\n"]
 
-    main = sources.get(main)
-    if main:
-        add_source(output, sources, main)
+    if entries is None:
+        main = sources.get(main)
+        if main:
+            add_source(output, sources, main)
 
-    for source in sources.values():
-        add_source(output, sources, source)
+        for source in sources.values():
+            add_source(output, sources, source)
+    else:
+        # Only the closure of the entries is merged.
+        for name in entries:
+            try:
+                source = sources[name]
+            except KeyError:
+                raise NotFoundError("<entries>", name)
+            add_source(output, sources, source)
 
     output.append("})(this);  // function(Nuvola)\n")
     return "".join(output)
 
-def mergejs(sources, main="main"):
-    sources = parse_sources(sources)
-    output = merge_sources(sources, main)
+def mergejs(sources, main="main", index_file=None, entries=None):
+    index = SourceIndex(index_file)
+    if entries is not None:
+        sources = find_closure(entries, sources, index)
+    sources = parse_sources(sources, index)
+    index.save()
+    output = merge_sources(sources, main, entries)
     return output
 
+def gzip_size(data):
+    return len(gzip.compress(data, GZIP_LEVEL, mtime=0))
+
+def bundle_report(files, main="main", index_file=None, entries=None):
+    """
+    Merges sources like `mergejs` and returns the output with a report of what the bundle consists of.
+
+    For each merged module, the report lists its raw and gzipped size, the number of modules that require
+    it (fan-in) and that it requires (fan-out), and the number and raw size of modules in its require()
+    closure, i.e. what the module costs including everything it pulls in. Sizes are in bytes and the gzipped
+    size of a module is that of the module compressed alone.
+    """
+    index = SourceIndex(index_file)
+    if entries is not None:
+        files = find_closure(entries, files, index)
+    sources = parse_sources(files, index)
+    output = merge_sources(sources, main, entries)
+
+    merged = [source for source in sources.values() if source.merged]
+    paths = [source.path for source in merged]
+    fan_in = {source.name: 0 for source in merged}
+    for source in merged:
+        for dep_name in set(source.requires):
+            fan_in[dep_name] += 1
+
+    sizes = {}
+    modules = []
+    for source in merged:
+        chunk = (get_header(source) + "".join(source.data)).encode("utf-8")
+        sizes[source.path] = len(chunk)
+        modules.append({
+            "name": source.name, "path": source.path, "raw": len(chunk), "gzip": gzip_size(chunk),
+            "fan_in": fan_in[source.name], "fan_out": len(set(source.requires))})
+    for module in modules:
+        closure = find_closure([module["name"]], paths, index)
+        module["closure_modules"] = len(closure)
+        module["closure_raw"] = sum(sizes[path] for path in closure)
+    index.save()
+
+    data = output.encode("utf-8")
+    modules.sort(key=lambda module: (-module["raw"], module["name"]))
+    return output, {"raw": len(data), "gzip": gzip_size(data), "modules": modules}
+
+def parse_budget(spec):
+    """Parses a size budget such as '120000', '120k' or 'gzip:30k' to a (metric, bytes) pair."""
+    m = BUDGET_RE.match(spec.strip())
+    if not m:
+        raise BudgetError(spec)
+    metric, size, kilo = m.groups()
+    return metric or "raw", int(size) * (1024 if kilo else 1)
+
+def check_budgets(report, bundle_budget=None, module_budget=None):
+    """Returns messages about the bundle or modules exceeding their (metric, bytes) budgets."""
+    errors = []
+    if bundle_budget:
+        metric, limit = bundle_budget
+        if report[metric] > limit:
+            errors.append("The bundle has %d %s bytes, the budget is %d." % (report[metric], metric, limit))
+    if module_budget:
+        metric, limit = module_budget
+        for module in report["modules"]:
+            if module[metric] > limit:
+                errors.append("Module '%s' has %d %s bytes, the budget is %d." % (
+                    module["path"], module[metric], metric, limit))
+    return errors
+
+def format_report(report):
+    lines = ["%-20s %8s %8s %6s %7s %8s %11s" % (
+        "Module", "Raw", "Gzip", "Fan-in", "Fan-out", "Closure", "Closure raw")]
+    for module in report["modules"]:
+        lines.append("%-20s %8d %8d %6d %7d %8d %11d" % (
+            module["name"], module["raw"], module["gzip"], module["fan_in"], module["fan_out"],
+            module["closure_modules"], module["closure_raw"]))
+    lines.append("Bundle: %d modules, %d bytes, %d bytes gzipped" % (
+        len(report["modules"]), report["raw"], report["gzip"]))
+    return "\n".join(lines)
+
 if __name__ == "__main__":
+    import argparse
+    import json
     import sys
-    files = sys.argv[1:]
-    output = mergejs(files)
-    print(output)
+    parser = argparse.ArgumentParser(description="Merges JavaScript modules according to their require() calls.")
+    parser.add_argument("-e", "--entry", action="append", dest="entries",
+        help="merge only the closure of the given module")
+    parser.add_argument("--report", action="store_true", help="print a report of module sizes instead of the output")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--budget", type=parse_budget, help="maximal size of the bundle, e.g. 120k or gzip:30k")
+    parser.add_argument("--module-budget", type=parse_budget, help="maximal size of each module, e.g. 20k or gzip:6k")
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args(sys.argv[1:])
+
+    if not (args.report or args.json or args.budget or args.module_budget):
+        print(mergejs(args.files, entries=args.entries))
+        sys.exit(0)
+
+    output, report = bundle_report(args.files, entries=args.entries)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif args.report:
+        print(format_report(report))
+    errors = check_budgets(report, args.budget, args.module_budget)
+    for error in errors:
+        print("Error: " + error, file=sys.stderr)
+    sys.exit(1 if errors else 0)
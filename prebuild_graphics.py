@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+__doc__ = "Rasterizes and optimizes icons from graphics/ in parallel, skipping outputs newer than their sources."
+
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+APP_ICON_SOURCES = {
+    16: "graphics/nuvola-icon/nuvola-player.16.svg",
+    22: "graphics/nuvola-icon/nuvola-player.22.svg",
+    24: "graphics/nuvola-icon/nuvola-player.22.svg",
+    32: "graphics/nuvola-icon/nuvola-player.22.svg",
+    48: "graphics/nuvola-icon/nuvola-player.orig.svg",
+    64: "graphics/nuvola-icon/nuvola-player.orig.svg",
+}
+SCALABLE_APP_ICON_SOURCE = "graphics/nuvola-icon/nuvola-player.orig.svg"
+WEB_APP_ICON_SIZE = 48
+
+Job = namedtuple("Job", "source output size")
+
+
+def list_jobs():
+    """Returns all (source, output, size) jobs; output paths are relative to a prefix, size None means an SVG."""
+    jobs = [Job(source, "data/icons/%d.png" % size, size) for size, source in sorted(APP_ICON_SOURCES.items())]
+    jobs.append(Job(SCALABLE_APP_ICON_SOURCE, "data/icons/scalable.svg", None))
+    for source in sorted(glob("graphics/service-icons/*.svg")):
+        name = os.path.basename(source)[:-len(".svg")]
+        if "." not in name:
+            jobs.append(Job(source, "data/nuvolaplayer3/web_apps/%s/icon.png" % name, WEB_APP_ICON_SIZE))
+    return jobs
+
+
+def get_command(job, output):
+    if job.size is None:
+        return ["scour", "-q", "-i", job.source, "-o", output]
+    return ["rsvg-convert", "-w", str(job.size), "-h", str(job.size), job.source, "-o", output]
+
+
+def run_job(job, output):
+    # A temporary file, so that a failed job doesn't leave a fresh-looking partial output.
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp = output + ".tmp"
+    command = get_command(job, tmp)
+    print("+ " + " ".join(command), file=sys.stderr)
+    try:
+        subprocess.run(command, check=True)
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def is_outdated(job, output):
+    """
+    Returns True if `output` is missing or older than its source or this script, which defines sizes.
+
+    Like make, this needs no state besides the files themselves.
+    """
+    try:
+        mtime = os.stat(output).st_mtime_ns
+    except FileNotFoundError:
+        return True
+    return any(os.stat(path).st_mtime_ns > mtime for path in (job.source, os.path.abspath(__file__)))
+
+
+def prebuild_graphics(prefix=".", jobs=1, force=False):
+    """
+    Regenerates outputs in `prefix` that are missing or outdated, all of them if `force` is set.
+
+    Returns the number of regenerated outputs and the number of failures among them.
+    """
+    pending = [job for job in list_jobs() if force or is_outdated(job, os.path.join(prefix, job.output))]
+    failed = []
+    with ThreadPoolExecutor(max(1, jobs)) as executor:
+        futures = [(job, executor.submit(run_job, job, os.path.join(prefix, job.output))) for job in pending]
+        for job, future in futures:
+            try:
+                future.result()
+            except (OSError, subprocess.CalledProcessError) as e:
+                print("Error: %s: %s" % (job.output, e), file=sys.stderr)
+                failed.append(job)
+    return len(pending), len(failed)
+
+
+def main(argv):
+    parser = ArgumentParser(argv[0], description=__doc__)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Number of parallel jobs")
+    parser.add_argument("-p", "--prefix", default=os.environ.get("PREFIX", "."),
+        help="Directory to store outputs in, defaults to $PREFIX or the current directory")
+    parser.add_argument("-f", "--force", action="store_true", help="Regenerate all outputs")
+    args = parser.parse_args(argv[1:])
+    generated, failed = prebuild_graphics(args.prefix, args.jobs, args.force)
+    print("%d outputs regenerated, %d failed." % (generated - failed, failed), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
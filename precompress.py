@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+__doc__ = "Writes gzip and zstd variants of static assets and a manifest of their sizes, digests and ETags."
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+from argparse import ArgumentParser
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST = "manifest.json"
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 19
+
+
+def compress_gzip(data):
+    # No file name and zero mtime so that the output is reproducible.
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def compress_zstd(data):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+ENCODINGS = {
+    "gzip": (".gz", compress_gzip),
+    "zstd": (".zst", compress_zstd),
+}
+
+
+def get_encodings(zstd=False):
+    """Returns names of available encodings, zstd only if requested and the zstandard module is installed."""
+    return ["gzip", "zstd"] if zstd and zstandard is not None else ["gzip"]
+
+
+def create_etag(digest, encoding=None):
+    # Each encoding needs its own strong validator because the bytes differ.
+    return '"%s%s"' % (digest[:32], "-" + encoding if encoding else "")
+
+
+def precompress(data, encodings):
+    """Returns a dictionary of encoding name to compressed data."""
+    return {encoding: ENCODINGS[encoding][1](data) for encoding in encodings}
+
+
+def create_entry(name, data, compressed):
+    """Returns a manifest entry of an asset `name`; variants that are not smaller than `data` are left out."""
+    digest = hashlib.sha256(data).hexdigest()
+    variants = {}
+    for encoding, variant in sorted(compressed.items()):
+        if len(variant) < len(data):
+            variants[encoding] = {
+                "path": name + ENCODINGS[encoding][0],
+                "size": len(variant),
+                "sha256": hashlib.sha256(variant).hexdigest(),
+                "etag": create_etag(digest, encoding),
+            }
+    return {"size": len(data), "sha256": digest, "etag": create_etag(digest), "encodings": variants}
+
+
+def write_file(path, data):
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def write_manifest(path, entries):
+    write_file(path, (json.dumps(entries, indent=2, sort_keys=True) + "\n").encode("utf-8"))
+
+
+def precompress_files(output_dir, paths, encodings):
+    """Writes compressed variants of `paths` to `output_dir` and returns manifest entries."""
+    os.makedirs(output_dir, exist_ok=True)
+    entries = {}
+    for path in paths:
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        compressed = precompress(data, encodings)
+        for encoding, variant in compressed.items():
+            write_file(os.path.join(output_dir, name + ENCODINGS[encoding][0]), variant)
+        entries[name] = create_entry(name, data, compressed)
+    return entries
+
+
+def main(argv):
+    parser = ArgumentParser(argv[0], description=__doc__)
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("-m", "--manifest", help="Manifest path [OUTPUT/%s]" % MANIFEST)
+    parser.add_argument("--zstd", action="store_true", help="Write zstd variants too (requires zstandard)")
+    parser.add_argument("files", nargs="+", help="Assets to compress")
+    args = parser.parse_args(argv[1:])
+    if args.zstd and zstandard is None:
+        print("Error: The zstandard module is not installed.", file=sys.stderr)
+        return 1
+    entries = precompress_files(args.output, args.files, get_encodings(args.zstd))
+    write_manifest(args.manifest or os.path.join(args.output, MANIFEST), entries)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
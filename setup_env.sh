@@ -151,8 +151,17 @@ build_webgen_doc()
 
 build_js_doc()
 {
-    ./nuvolajsdoc.py
-    while true; do inotifywait -e delete -e create -e modify -r src/mainjs doc/theme/templates/jsdoc.html; sleep 1; ./nuvolajsdoc.py; done
+    ./nuvolajsdoc.py --serve "$@"
+}
+
+start_js_doc_daemon()
+{
+    ./nuvolajsdoc.py --daemon "$@" &
+}
+
+update_js_doc()
+{
+    ./nuvolajsdocclient.py "$@"
 }
 
 echo "--- Limits ---"
@@ -0,0 +1,63 @@
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_vala_defs
+
+SOURCE = "namespace Nuvola {\n#if UNKNOWN\n    int a,b;\n#endif\n}\n"
+
+
+class LineNumbersTest(unittest.TestCase):
+    """Errors report 1-based line numbers as editors and CI annotations expect."""
+
+    def test_buffer(self):
+        buffer = io.StringIO(SOURCE)
+        buffer.name = "File.vala"
+        errors = check_vala_defs.check_definitions_in_files(
+            {"TRUE"}, [buffer], check_vala_defs.parse_checks(["space_after_comma"]))
+        self.assertEqual([(error.__class__.__name__, error.line) for error in errors],
+                         [("Error", 2), ("StyleError", 3)])
+
+    def test_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "File.vala")
+            with open(path, "wt", encoding="utf-8") as f:
+                f.write(SOURCE)
+            # Without style checks, the memory-mapped scanner is used.
+            errors = check_vala_defs.check_definitions_in_paths({"TRUE"}, [path])
+            self.assertEqual([(error.path, error.line) for error in errors], [(path, 2)])
+            errors = check_vala_defs.check_definitions_in_paths(
+                {"TRUE"}, [path], checks=check_vala_defs.parse_checks(["space_after_comma"]))
+            self.assertEqual([error.line for error in errors], [2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mergegir import MergeError, SymbolIndex
+
+SOURCES = ["Base-1.0.gir", "Extra-1.0.gir"]
+SLOTS = 1024  # The initial size of the table.
+
+
+class SymbolIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SymbolIndex(SOURCES)
+
+    def test_duplicate_and_conflict(self):
+        self.assertTrue(self.index.add("a", [10, 20], 1 << 20, 0))
+        self.assertFalse(self.index.add("a", [10, 20], 1 << 20, 1))
+        self.assertFalse(self.index.add("b", [30, 20], 2 << 20, 1))
+        self.assertEqual(self.index.duplicates, [("a", "Extra-1.0.gir", "Base-1.0.gir")])
+        self.assertEqual(self.index.conflicts, [("b", "Extra-1.0.gir", "Base-1.0.gir")])
+        # Keys of a rejected member are not added.
+        self.assertTrue(self.index.add("c", [30], 3 << 20, 1))
+
+    def test_collisions(self):
+        # All keys map to the same slot, the last one also wraps around the end of the table.
+        keys = [(i << 32) | (SLOTS - 1) for i in range(1, 6)]
+        for i, key in enumerate(keys):
+            self.assertTrue(self.index.add("m%d" % i, [key], i << 20, 0), key)
+        for i, key in enumerate(keys):
+            self.assertFalse(self.index.add("m%d" % i, [key], i << 20, 1), key)
+        self.assertEqual(len(self.index.duplicates), len(keys))
+        self.assertEqual(self.index.conflicts, [])
+        self.assertEqual(self.index.size, len(keys))
+
+    def test_resize(self):
+        count = 5 * SLOTS
+        for i in range(count):
+            self.assertTrue(self.index.add("m%d" % i, [i * 2 + 2, i * 2 + 3], i << 20, 0))
+        self.assertEqual(self.index.size, 2 * count)
+        self.assertGreaterEqual(len(self.index.keys), 3 * self.index.size // 2)
+        for i in range(count):
+            self.assertFalse(self.index.add("m%d" % i, [i * 2 + 3], i << 20, 1))
+        self.assertEqual(len(self.index.duplicates), count)
+        self.assertEqual(self.index.conflicts, [])
+
+    def test_too_many_sources(self):
+        with self.assertRaises(MergeError):
+            SymbolIndex(["%d.gir" % i for i in range(1 << SymbolIndex.SOURCE_BITS)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,359 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+__doc__ = ("Benchmarks the build-time Python tools on synthetic corpora and the real source tree"
+           " and compares time and peak memory to a baseline recorded on this machine.")
+
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Absolute timings only make sense on the machine that recorded them, so the baseline isn't committed.
+BASELINE = os.path.join(TOP, "build", "benchmark-baseline.json")
+VALA_DEFINITIONS = ("FLATPAK TILIADO_API GENUINE UNITY APPINDICATOR EXPERIMENTAL NUVOLA_RUNTIME"
+                    " NUVOLA_ADK NUVOLA_CDK HAVE_CEF FALSE TRUE").split()
+VALA_ACTIVE_DEFINITIONS = ("FLATPAK", "TILIADO_API", "HAVE_CEF", "TRUE")
+
+
+def generate_require_graph(directory, count, seed=1):
+    """Writes `count` JS modules, each requiring up to five earlier modules."""
+    rnd = random.Random(seed)
+    for i in range(count):
+        requires = sorted(rnd.sample(range(i), min(i, rnd.randint(0, 5))))
+        with open(os.path.join(directory, "module%d.js" % i), "wt", encoding="utf-8") as f:
+            for dep in requires:
+                f.write("require('module%d')\n" % dep)
+            f.write("\n/* Module %d */\n" % i)
+            for j in range(20):
+                f.write("var value%d_%d = function (a, b) {\n    return a + b + %d\n}\n" % (i, j, j))
+
+
+def generate_doc_symbols(directory, count, per_file=50):
+    """Writes doc-commented prototypes with methods, signals and fields, `count` symbols in total."""
+    for i in range(0, count, per_file):
+        with open(os.path.join(directory, "symbols%d.js" % i), "wt", encoding="utf-8") as f:
+            f.write("require('core')\n\n/**\n * Prototype number %d\n *\n * @since API 4.%d\n */\n" % (i, i % 12))
+            f.write("var Proto%d = $prototype(null, Nuvola.SignalsMixin)\n\n" % i)
+            f.write("/**\n * Initializes a new object\n *\n * @param String name    name of the **object**\n */\n")
+            f.write("Proto%d.$init = function (name) {\n" % i)
+            for j in range(per_file - 2):
+                f.write("    /**\n     * Emitted when thing %d changes\n     *\n"
+                        "     * @param Proto%d emitter    object that emitted the signal\n     */\n"
+                        "    this.addSignal('Thing%dChanged')\n" % (j, i, j))
+            f.write("}\n\n/**\n * Returns the name, see @link{Proto%d.$init|init}\n *\n"
+                    " * @return String    the name\n */\nProto%d.getName = function () {\n}\n" % (i, i))
+            f.write("\nNuvola.Proto%d = Proto%d\n" % (i, i))
+
+
+def generate_vala_tree(directory, count, seed=1):
+    """Writes `count` Vala files full of nested #if blocks."""
+    rnd = random.Random(seed)
+    for i in range(count):
+        subdir = os.path.join(directory, "dir%d" % (i // 50))
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, "File%d.vala" % i), "wt", encoding="utf-8") as f:
+            if i % 10 == 0:
+                f.write("#if %s\n" % rnd.choice(VALA_DEFINITIONS))
+            f.write("namespace Nuvola {\n\npublic class Class%d : GLib.Object {\n" % i)
+            for j in range(40):
+                a, b = rnd.sample(VALA_DEFINITIONS, 2)
+                f.write("#if %s && !%s\n    public void method%d_a(int x, int y) {\n"
+                        "        message(\"#if not a directive %%d\", x);\n    }\n" % (a, b, j))
+                f.write("#elif %s || (%s == FALSE)\n    public void method%d_b() {\n    }\n" % (b, a, j))
+                f.write("#else\n    public void method%d_c() {\n    }\n#endif\n" % j)
+            f.write("}\n\n}  // namespace Nuvola\n")
+            if i % 10 == 0:
+                f.write("#endif\n")
+
+
+def generate_gir(directory, count):
+    """Writes a base GIR and two extra GIRs with `count` classes, constants and functions each."""
+    paths = []
+    for ns in "Base", "Extra1", "Extra2":
+        path = os.path.join(directory, "%s-1.0.gir" % ns)
+        paths.append(path)
+        with open(path, "wt", encoding="utf-8") as f:
+            f.write('<?xml version="1.0"?>\n<repository version="1.2"'
+                    ' xmlns="http://www.gtk.org/introspection/core/1.0"'
+                    ' xmlns:c="http://www.gtk.org/introspection/c/1.0"'
+                    ' xmlns:glib="http://www.gtk.org/introspection/glib/1.0">\n'
+                    '<include name="GLib" version="2.0"/>\n<package name="%s-1.0"/>\n'
+                    '<c:include name="%s.h"/>\n<namespace name="%s" version="1.0" c:prefix="%s"'
+                    ' c:identifier-prefixes="%s" c:symbol-prefixes="%s">\n'
+                    % (ns.lower(), ns.lower(), ns, ns, ns, ns.lower()))
+            for i in range(count):
+                f.write('\t<class name="%sC%d" c:type="%sC%d" glib:type-name="%sC%d" parent="GObject.Object">\n'
+                        '\t\t<method name="m" c:identifier="%s_c%d_m"><return-value transfer-ownership="none">'
+                        '<type name="none" c:type="void"/></return-value></method>\n'
+                        '\t\t<constant name="K" value="(null)" c:type="%sC%dK"><type name="utf8"/></constant>\n'
+                        '\t</class>\n' % (ns, i, ns, i, ns, i, ns.lower(), i, ns, i))
+                f.write('\t<function name="%sf%d" c:identifier="%s_f%d"><doc xml:space="preserve">Doc &amp; '
+                        'text</doc><return-value/></function>\n' % (ns, i, ns.lower(), i))
+            f.write('</namespace>\n</repository>\n')
+    return paths
+
+
+def generate_symbol_count(directory, count):
+    """Writes the number of members for the symbol index benchmarks, which generate keys on the fly."""
+    with open(os.path.join(directory, "count"), "wt", encoding="utf-8") as f:
+        f.write(str(count))
+
+
+def iter_symbol_members(directory):
+    """Yields (name, keys, digest) of members like mergegir.parse_namespace() does."""
+    from mergegir import compact_digest
+    with open(os.path.join(directory, "count"), "rt", encoding="utf-8") as f:
+        count = int(f.read())
+    for i in range(count):
+        name = "f%d" % i
+        keys = [compact_digest("function\0" + name), compact_digest("c\0base_" + name)]
+        yield name, keys, compact_digest("<function name=\"%s\"/>" % name)
+
+
+def list_files(directory, suffix):
+    return sorted(
+        os.path.join(root, name) for root, dirs, files in os.walk(directory) for name in files if name.endswith(suffix))
+
+
+def bench_mergejs(directory):
+    from nuvolamergejs import mergejs
+    mergejs(list_files(directory, ".js"))
+
+
+def bench_jsdoc(directory):
+    from nuvolajsdoc import DocGenerator
+    cwd = os.getcwd()
+    os.chdir(TOP)
+    try:
+        generator = DocGenerator("Nuvola", os.devnull, directory, "doc/jsdoc_conf.py")
+        generator.update()
+        generator.render()
+    finally:
+        os.chdir(cwd)
+
+
+def bench_check_vala_defs(directory):
+    import check_vala_defs
+    paths = list_files(directory, ".vala")
+    with open(os.devnull, "wt") as output:
+        check_vala_defs.run(definitions=VALA_DEFINITIONS, files=paths, output=output)
+    check_vala_defs.create_manifest(VALA_ACTIVE_DEFINITIONS, paths)
+
+
+def bench_check_vala_style(directory):
+    # All CPUs are allowed, the worker pool is used only above check_vala_defs.PARALLEL_MIN_SIZE_STYLE.
+    import check_vala_defs
+    with open(os.devnull, "wt") as output:
+        check_vala_defs.run(definitions=VALA_DEFINITIONS, files=list_files(directory, ".vala"),
+            checks=check_vala_defs.STYLE_CHECKS, jobs=os.cpu_count() or 1, output=output)
+
+
+def bench_mergegir(directory):
+    from mergegir import merge_gir
+    base, *extras = list_files(directory, ".gir")
+    merge_gir(os.path.join(directory, "Merged-1.0.out"), base, extras)
+
+
+def bench_mergegir_parallel(directory):
+    from mergegir import merge_gir
+    base, *extras = list_files(directory, ".gir")
+    merge_gir(os.path.join(directory, "Merged-1.0.out"), base, extras, jobs=len(extras) + 1)
+
+
+def bench_symbol_index(directory):
+    from mergegir import SymbolIndex
+    index = SymbolIndex(["Base-1.0.gir"])
+    for name, keys, digest in iter_symbol_members(directory):
+        index.add(name, keys, digest, 0)
+
+
+def bench_symbol_dict(directory):
+    # The simplest alternative to SymbolIndex: a dict of the same key digests and packed values.
+    symbols = {}
+    for name, keys, digest in iter_symbol_members(directory):
+        if not any(key in symbols for key in keys):
+            for key in keys:
+                symbols[key] = digest & ~0xFFFF
+    return symbols
+
+
+def bench_mergegir_stream(directory):
+    # The bare streaming pass of mergegir without the symbol index: every member is parsed,
+    # serialized and written out right away. Its peak memory is the floor for a merge.
+    from mergegir import GirWriter, GirHeader, iter_namespace_children
+    paths = list_files(directory, ".gir")
+    namespaces = [ns for path in paths for ns in GirHeader(path).namespaces]
+    with open(os.path.join(directory, "Merged-1.0.out"), "wt", encoding="utf-8") as f:
+        writer = GirWriter(f, namespaces)
+        for path in paths:
+            for elm in iter_namespace_children(path):
+                writer.element(elm)
+
+
+# name: (generator or None for the real tree, corpus size, real source directory, benchmark)
+BENCHMARKS = {
+    "mergejs_synthetic": (generate_require_graph, 2000, None, bench_mergejs),
+    "mergejs_src": (None, 0, "src/mainjs", bench_mergejs),
+    "jsdoc_synthetic": (generate_doc_symbols, 5000, None, bench_jsdoc),
+    "jsdoc_src": (None, 0, "src/mainjs", bench_jsdoc),
+    "check_vala_defs_synthetic": (generate_vala_tree, 2000, None, bench_check_vala_defs),
+    "check_vala_defs_src": (None, 0, "src", bench_check_vala_defs),
+    "check_vala_style_src": (None, 0, "src", bench_check_vala_style),
+    "mergegir_synthetic": (generate_gir, 20000, None, bench_mergegir),
+    "mergegir_parallel_synthetic": (generate_gir, 20000, None, bench_mergegir_parallel),
+    "mergegir_stream_synthetic": (generate_gir, 20000, None, bench_mergegir_stream),
+    "symbol_dict_synthetic": (generate_symbol_count, 500000, None, bench_symbol_dict),
+    "symbol_index_synthetic": (generate_symbol_count, 500000, None, bench_symbol_index),
+}
+
+# name: (reference benchmark, allowed ratio of peak memory to the reference measured in the same run)
+# The symbol index of mergegir adds about 0.6x of the streaming pass, collecting all members was 5x.
+# SymbolIndex exists only because it takes less memory than a plain dict.
+MEMORY_LIMITS = {
+    "mergegir_synthetic": ("mergegir_stream_synthetic", 2.0),
+    "mergegir_parallel_synthetic": ("mergegir_stream_synthetic", 2.0),
+    "symbol_index_synthetic": ("symbol_dict_synthetic", 0.8),
+}
+
+
+def measure(func, directory):
+    """Runs a benchmark and returns elapsed seconds and peak memory in KiB. Meant to run in a fresh process."""
+    sys.path.insert(0, TOP)
+    with open(os.devnull, "wt") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        func(directory)
+        elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_benchmark(name, scale=1.0, repeat=3):
+    generate, size, source_dir, func = BENCHMARKS[name]
+    with tempfile.TemporaryDirectory(prefix="nuvola-benchmark-") as tmp:
+        if generate:
+            generate(tmp, max(1, int(size * scale)))
+            directory = tmp
+        else:
+            directory = os.path.join(TOP, source_dir)
+        times, memory = [], []
+        for i in range(repeat):
+            # A fresh process for each run, so that peak memory isn't inherited from previous runs.
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                elapsed, peak = executor.submit(measure, func, directory).result()
+            times.append(elapsed)
+            memory.append(peak)
+    return {"time": round(min(times), 4), "memory": max(memory)}
+
+
+def compare(name, result, baseline, time_threshold, memory_threshold):
+    """Returns a list of regressions of `result` against the `baseline` entry."""
+    regressions = []
+    if baseline:
+        for key, threshold in ("time", time_threshold), ("memory", memory_threshold):
+            if result[key] > baseline[key] * threshold:
+                regressions.append("%s: %s %.3g is %.2fx the baseline %.3g, the threshold is %.2fx." % (
+                    name, key, result[key], result[key] / baseline[key], baseline[key], threshold))
+    return regressions
+
+
+def check_memory_limit(name, results):
+    """Returns a list of regressions of peak memory of `name` against its reference in `results`."""
+    reference, limit = MEMORY_LIMITS[name]
+    if reference not in results:
+        return ["%s: memory limit not checked, the reference %s has not run." % (name, reference)]
+    ratio = results[name]["memory"] / results[reference]["memory"]
+    if ratio > limit:
+        return ["%s: memory %d KiB is %.2fx the %s %d KiB, the limit is %.2fx." % (
+            name, results[name]["memory"], ratio, reference, results[reference]["memory"], limit)]
+    return []
+
+
+def main(argv):
+    parser = ArgumentParser(argv[0], description=__doc__,
+        epilog="Returns 0 on success, 1 when a benchmark exceeds its baseline by more than a threshold"
+        " or its peak memory limit relative to a reference benchmark.")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+        help="Benchmarks to run, all by default: %s" % ", ".join(BENCHMARKS))
+    parser.add_argument("-s", "--scale", type=float, default=1.0, help="Scale synthetic corpus sizes")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per benchmark, the best time counts")
+    parser.add_argument("-b", "--baseline", default=BASELINE, help="Baseline file [build/benchmark-baseline.json]")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the new baseline")
+    parser.add_argument("--time-threshold", type=float, default=1.25,
+        help="Allowed ratio of time to the baseline [1.25]")
+    parser.add_argument("--memory-threshold", type=float, default=1.25,
+        help="Allowed ratio of peak memory to the baseline [1.25]")
+    args = parser.parse_args(argv[1:])
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error("Unknown benchmarks: %s" % ", ".join(unknown))
+    # References of memory limits run first, so that their results are available.
+    references = [MEMORY_LIMITS[name][0] for name in names if name in MEMORY_LIMITS]
+    names = list(dict.fromkeys(references + names))
+    try:
+        with open(args.baseline, "rt", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+        if not args.save_baseline:
+            print("No baseline in %s, record one with --save-baseline." % args.baseline, file=sys.stderr)
+    if args.scale != 1.0 and not args.save_baseline:
+        # Results of a different corpus size are not comparable.
+        baseline = {}
+
+    regressions = []
+    results = {}
+    for name in names:
+        result = results[name] = run_benchmark(name, args.scale, args.repeat)
+        previous = baseline.get(name)
+        print("%-28s %9.1f ms %9d KiB%s" % (
+            name, result["time"] * 1000, result["memory"],
+            "  (baseline %.1f ms, %d KiB)" % (previous["time"] * 1000, previous["memory"]) if previous else ""))
+        regressions.extend(compare(name, result, previous, args.time_threshold, args.memory_threshold))
+        if name in MEMORY_LIMITS:
+            regressions.extend(check_memory_limit(name, results))
+
+    if args.save_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "wt", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+    for regression in regressions:
+        print("Regression: " + regression, file=sys.stderr)
+    return 1 if regressions and not args.save_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# Copyright 2011-2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+__doc__ = "Creates update packages nuvolaplayer--APP-MAJOR.MINOR.tar.gz of web app directories."
+
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+CONTROL_FORMAT = 3
+
+
+def create_control(app_id):
+    return ("format = %d\napp_id = %s\n" % (CONTROL_FORMAT, app_id)).encode("utf-8")
+
+
+def create_update_package(result_dir, web_app_dir):
+    """
+    Creates an update package of `web_app_dir` in `result_dir` and returns its path.
+
+    The package contains the web app directory and a `control` file, which is created in memory.
+    """
+    web_app_dir = os.path.abspath(web_app_dir)
+    web_app = os.path.basename(web_app_dir)
+    with open(os.path.join(web_app_dir, "metadata.json"), encoding="utf-8") as f:
+        metadata = json.load(f)
+    path = os.path.join(result_dir, "nuvolaplayer--%s-%s.%s.tar.gz" % (
+        web_app, metadata["version_major"], metadata["version_minor"]))
+
+    control = create_control(web_app)
+    info = tarfile.TarInfo("control")
+    info.size = len(control)
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    tmp = path + ".tmp"
+    with tarfile.open(tmp, "w:gz", compresslevel=9, format=tarfile.GNU_FORMAT) as tar:
+        tar.add(web_app_dir, arcname=web_app)
+        tar.addfile(info, io.BytesIO(control))
+    os.replace(tmp, path)
+    return path
+
+
+def create_update_packages(result_dir, web_app_dirs, jobs=1):
+    """Creates update packages in parallel and yields their paths in the order of `web_app_dirs`."""
+    web_app_dirs = list(web_app_dirs)
+    if jobs > 1 and len(web_app_dirs) > 1:
+        try:
+            context = multiprocessing.get_context("forkserver")
+        except ValueError:
+            context = None
+        with ProcessPoolExecutor(min(jobs, len(web_app_dirs)), mp_context=context) as executor:
+            yield from executor.map(create_update_package, [result_dir] * len(web_app_dirs), web_app_dirs)
+    else:
+        for web_app_dir in web_app_dirs:
+            yield create_update_package(result_dir, web_app_dir)
+
+
+def main(argv):
+    parser = ArgumentParser(argv[0], description=__doc__)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("result", help="Directory to store update packages")
+    parser.add_argument("web_apps", nargs="*", metavar="web_app", help="Web app directory")
+    args = parser.parse_args(argv[1:])
+    for path in create_update_packages(os.path.abspath(args.result), args.web_apps, args.jobs):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
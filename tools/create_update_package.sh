@@ -24,27 +24,4 @@
 
 set -eu
 
-WD=$PWD
-RESULT="$(readlink -f "$1")"
-shift
-
-for WEB_APP_DIR in "$@"; do
-
-  cd "$WD"
-  cd "$WEB_APP_DIR"
-  cd ..
-  
-  WEB_APP=`basename "$WEB_APP_DIR"`
-  MAJOR=`"$WD/tools/print_json.py" "$WEB_APP/metadata.json" version_major`
-  MINOR=`"$WD/tools/print_json.py" "$WEB_APP/metadata.json" version_minor`
-  NAME=`"$WD/tools/print_json.py" "$WEB_APP/metadata.json" name`
-  TAR="$RESULT/nuvolaplayer--$WEB_APP-$MAJOR.$MINOR.tar"
-  
-  echo "format = 3" > control
-  echo "app_id = $WEB_APP" >> control
-  echo $TAR:
-  tar cvf $TAR $WEB_APP control
-  rm -f control 
-  gzip -9 -f $TAR
-  cd "$WD"
-done
+exec "$(dirname "$(readlink -f "$0")")/create_update_package.py" "$@"
@@ -1,11 +1,112 @@
 #!/usr/bin/python3
 
+# print_json.py FILE KEY
+# print_json.py [-k [VAR=]KEY]... [--shell | -0] [--strict] FILE...
+
 import sys
 import json
+import re
+import shlex
+from argparse import ArgumentParser
+
+MISSING = object()
+
+
+def parse_key(spec):
+	"""
+	Parses `VAR=dotted.key` or `dotted.key` to a (variable name, key path) pair.
+
+	The variable name is None if it is not given explicitly.
+	"""
+	var, sep, key = spec.partition("=")
+	if not sep:
+		return None, spec.split(".")
+	if not var.isidentifier():
+		raise ValueError("Invalid variable name: %r" % var)
+	return var, key.split(".")
+
+
+def get_variable_name(path):
+	"""Returns a shell variable name derived from a key path or None if there is no valid one."""
+	var = re.sub(r"\W", "_", ".".join(path))
+	return var if var.isidentifier() else None
+
+
+def lookup(data, path):
+	for part in path:
+		if isinstance(data, list):
+			try:
+				data = data[int(part)]
+			except (ValueError, IndexError):
+				return MISSING
+		elif isinstance(data, dict) and part in data:
+			data = data[part]
+		else:
+			return MISSING
+	return data
+
+
+def format_value(value):
+	if value is MISSING or value is None:
+		return ""
+	if isinstance(value, (dict, list)):
+		return json.dumps(value)
+	return str(value)
+
+
+def print_value(filename, key):
+	"""Prints the top-level `key` of a JSON file exactly as the original single-key tool did."""
+	with open(filename) as fd:
+		data = json.load(fd)
+		print(data[key])
+
+
+def main(argv):
+	if len(argv) == 3 and not argv[1].startswith("-") and not argv[2].startswith("-"):
+		# Legacy invocation: print_json.py FILE KEY
+		print_value(argv[1], argv[2])
+		return 0
+
+	parser = ArgumentParser(argv[0], description="Prints values from JSON files.")
+	parser.add_argument("-k", "--key", action="append", type=parse_key, default=[],
+		help="Dotted key path to print, optionally prefixed with a shell variable name, e.g. MAJOR=version_major")
+	group = parser.add_mutually_exclusive_group()
+	group.add_argument("--shell", action="store_true",
+		help="Print a line of shell variable assignments per file")
+	group.add_argument("-0", "--null", action="store_true",
+		help="Terminate values with NUL instead of new line")
+	parser.add_argument("--strict", action="store_true", help="Fail if a key is missing")
+	parser.add_argument("files", nargs="+", metavar="FILE")
+	args = parser.parse_args(argv[1:])
+
+	files, keys = args.files, args.key
+	if not keys:
+		parser.error("Specify keys with --key or use FILE KEY.")
+	if args.shell:
+		for i, (var, path) in enumerate(keys):
+			var = var or get_variable_name(path)
+			if var is None:
+				parser.error("Key '%s' needs a variable name with --shell, use VAR=%s." % ((".".join(path),) * 2))
+			keys[i] = var, path
+
+	out = sys.stdout
+	for filename in files:
+		with open(filename) as fd:
+			data = json.load(fd)
+		values = []
+		for var, path in keys:
+			value = lookup(data, path)
+			if value is MISSING and args.strict:
+				print("Error: Key '%s' is missing in %s." % (".".join(path), filename), file=sys.stderr)
+				return 1
+			values.append((var, format_value(value)))
+		if args.shell:
+			out.write(" ".join("%s=%s" % (var, shlex.quote(value)) for var, value in values) + "\n")
+		else:
+			end = "\0" if args.null else "\n"
+			out.write("".join(value + end for var, value in values))
+	return 0
 
-filename = sys.argv[1]
-key = sys.argv[2]
 
-with open(filename) as fd:
-	data = json.load(fd)
-	print(data[key])
+if __name__ == "__main__":
+	sys.exit(main(sys.argv))
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+# coding: utf-8
+#
+# Copyright 2019 Jiří Janoušek <janousek.jiri@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+__doc__ = ("Validates metadata.json files of web apps in bulk and writes a compact index,"
+           " re-reading only metadata files that changed since the previous index.")
+
+import json
+import os
+import re
+import sys
+from argparse import ArgumentParser
+from collections import namedtuple
+
+INDEX_FORMAT = 1
+METADATA_FILENAME = "metadata.json"
+DEFAULT_CATEGORY = "Network"
+ID_REGEX = re.compile(r"^[a-z0-9]+(?:_[a-z0-9]+)*$")
+MAINTAINER_LINK_PREFIXES = ("http://", "https://", "mailto:")
+
+MetadataError = namedtuple("MetadataError", "path message")
+
+
+def validate_metadata(meta):
+    """Returns a list of problems found in web app metadata, with the same rules as Nuvola.WebApp."""
+    errors = []
+
+    def get(key, kind, required=True):
+        value = meta.get(key)
+        if value is None:
+            if required:
+                errors.append("The %s key is missing." % key)
+            return None
+        if not isinstance(value, kind) or kind is int and isinstance(value, bool):
+            errors.append("The %s key is not %s." % (key, "an integer" if kind is int else "a string"))
+            return None
+        return value
+
+    if not isinstance(meta, dict):
+        return ["The metadata is not a JSON object."]
+    app_id = get("id", str)
+    if app_id is not None and not ID_REGEX.match(app_id):
+        errors.append("Invalid app id '%s'." % app_id)
+    if get("name", str) == "":
+        errors.append("Empty 'name' entry.")
+    if get("maintainer_name", str) == "":
+        errors.append("Empty 'maintainer_name' entry.")
+    maintainer_link = get("maintainer_link", str)
+    if maintainer_link is not None and not maintainer_link.startswith(MAINTAINER_LINK_PREFIXES):
+        errors.append("Empty or invalid 'maintainer_link' entry: '%s'." % maintainer_link)
+    for key, minimum in (("version_major", 1), ("version_minor", 0), ("api_major", 1), ("api_minor", 0)):
+        value = get(key, int)
+        if value is not None and value < minimum:
+            errors.append("The %s key must be greater or equal to %d." % (key, minimum))
+    for key in "version_micro", "window_width", "window_height":
+        value = get(key, int, required=False)
+        if value is not None and value < 0:
+            errors.append("The %s key must be greater or equal to zero." % key)
+    for key in "version_revision", "categories", "requirements", "allowed_uri":
+        get(key, str, required=False)
+    if meta.get("has_desktop_launcher") is not True:
+        errors.append("Web apps without a desktop launcher are no longer supported.")
+    return errors
+
+
+def create_entry(path, meta, stat):
+    categories = [c.strip().lower() for c in (meta.get("categories") or "").split(";") if c.strip()]
+    return {
+        "path": path,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "id": meta["id"],
+        "name": meta["name"],
+        "version": [meta["version_major"], meta["version_minor"], meta.get("version_micro", 0)],
+        "version_revision": meta.get("version_revision"),
+        "api_version": [meta["api_major"], meta["api_minor"]],
+        "categories": categories or [DEFAULT_CATEGORY.lower()],
+        "requirements": meta.get("requirements"),
+        "allowed_uri": meta.get("allowed_uri"),
+    }
+
+
+def load_entry(path, stat):
+    """Returns an index entry for metadata file `path` and a list of errors."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        return None, [MetadataError(path, "Cannot load metadata. %s" % e)]
+    errors = [MetadataError(path, message) for message in validate_metadata(meta)]
+    return (None if errors else create_entry(path, meta, stat)), errors
+
+
+def build_index(paths, previous=None):
+    """
+    Builds an index of metadata files `paths` and returns it with a list of errors.
+
+    Entries of `previous` index are reused if size and mtime of their metadata file haven't changed.
+    """
+    known = {}
+    if previous and previous.get("format") == INDEX_FORMAT:
+        known = {entry["path"]: entry for entry in previous["apps"]}
+    apps = {}
+    errors = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            errors.append(MetadataError(path, "Cannot load metadata. %s" % e))
+            continue
+        entry = known.get(path)
+        if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            entry, entry_errors = load_entry(path, stat)
+            errors.extend(entry_errors)
+        if entry is not None:
+            other = apps.get(entry["id"])
+            if other is not None:
+                errors.append(MetadataError(path, "Web app '%s' is already defined in %s." % (entry["id"], other["path"])))
+            else:
+                apps[entry["id"]] = entry
+    return {"format": INDEX_FORMAT, "apps": [apps[app_id] for app_id in sorted(apps)]}, errors
+
+
+def read_index(path):
+    """Returns an index stored in `path` or None if it doesn't exist or is invalid."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_index(path, index):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def scan_web_app_dirs(directories):
+    """Yields paths to metadata files of web apps in `directories`, sorted."""
+    for directory in directories:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name, METADATA_FILENAME)
+            if os.path.isfile(path):
+                yield path
+
+
+def update_index(index_path, paths):
+    """Updates the index in `index_path` for metadata files `paths` and returns a list of errors."""
+    index, errors = build_index(paths, read_index(index_path))
+    if not errors:
+        write_index(index_path, index)
+    return errors
+
+
+def main(argv):
+    parser = ArgumentParser(argv[0], description=__doc__,
+        epilog="Returns 0 on success, 1 when there are invalid metadata files.")
+    parser.add_argument("-d", "--directory", action='append', default=[],
+        help="Add a directory with web apps, e.g. web_apps")
+    parser.add_argument("-o", "--output", required=True, help="Path to the index file")
+    parser.add_argument("files", nargs="*", help="Additional metadata.json files")
+    args = parser.parse_args(argv[1:])
+    errors = update_index(args.output, args.files + list(scan_web_app_dirs(args.directory)))
+    for error in errors:
+        print("%s: %s" % error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))